@@ -0,0 +1,146 @@
+"""Stale-while-revalidate cache for analytics responses.
+
+Analytics endpoints aggregate across whole collections, and many admins load
+the same dashboards. Each response body is cached under its endpoint, the
+caller's role (and user for per-user views) and its query parameters, with a
+per-endpoint TTL. When an entry expires or a write invalidates one of its
+tags, readers keep getting the previous body while a single background
+refresh recomputes it, so a reader only waits when there is nothing cached or
+the entry is older than ``max_stale_seconds``. The cache is per worker
+process.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+FRESH, STALE, MISS = 'fresh', 'stale', 'miss'
+
+
+class AnalyticsEntry:
+    __slots__ = ('body', 'mimetype', 'tags', 'computed_at', 'fresh_until', 'invalidated')
+
+    def __init__(self, body, mimetype, tags, ttl_seconds, invalidated=False):
+        self.body = body
+        self.mimetype = mimetype
+        self.tags = frozenset(tags)
+        self.computed_at = time.monotonic()
+        self.fresh_until = self.computed_at + ttl_seconds
+        self.invalidated = invalidated
+
+    def age(self):
+        return time.monotonic() - self.computed_at
+
+
+class AnalyticsCache:
+    """Thread-safe LRU of analytics bodies with background refresh"""
+
+    def __init__(self, max_entries=512, max_stale_seconds=600, refresh_workers=2):
+        self.max_entries = max_entries
+        self.max_stale_seconds = max_stale_seconds
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='analytics-refresh')
+        # Bumped on every invalidation so a compute that raced a write is stored as stale
+        self.generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._compute_seconds = defaultdict(lambda: [0, 0.0, 0.0])  # endpoint -> [count, total, max]
+
+    def lookup(self, key):
+        """Return (entry, state); state is FRESH, STALE (serve it and refresh) or MISS"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if not entry.invalidated and time.monotonic() < entry.fresh_until:
+                    self.hits += 1
+                    return entry, FRESH
+                if entry.age() < self.max_stale_seconds:
+                    self.stale_hits += 1
+                    return entry, STALE
+            self.misses += 1
+            return None, MISS
+
+    def refresh_async(self, key, refresh):
+        """Run refresh() in the background unless one is already running for key"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._pool.submit(self._refresh, key, refresh)
+
+    def _refresh(self, key, refresh):
+        try:
+            refresh()
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            logger.error(f"Analytics refresh failed for {key[0]}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def store(self, key, body, mimetype, ttl_seconds, tags=(), generation=None):
+        with self._lock:
+            entry = AnalyticsEntry(body, mimetype, tags, ttl_seconds,
+                                   invalidated=generation is not None and generation != self.generation)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+
+    def record_compute(self, endpoint, seconds):
+        with self._lock:
+            timing = self._compute_seconds[endpoint]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def invalidate(self, *tags):
+        """Mark entries with any of these tags stale; they refresh on next read"""
+        tags = set(tags)
+        with self._lock:
+            self.generation += 1
+            for entry in self._entries.values():
+                if entry.tags & tags:
+                    entry.invalidated = True
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "maxStaleSeconds": self.max_stale_seconds,
+                "hits": self.hits,
+                "staleHits": self.stale_hits,
+                "misses": self.misses,
+                "hitRatio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else None,
+                "refreshes": self.refreshes,
+                "refreshErrors": self.refresh_errors,
+                "refreshing": len(self._refreshing),
+                "computeMs": {
+                    endpoint: {
+                        "count": count,
+                        "avg": round(total / count * 1000, 2),
+                        "max": round(longest * 1000, 2)
+                    }
+                    for endpoint, (count, total, longest) in self._compute_seconds.items()
+                }
+            }
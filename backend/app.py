@@ -1,24 +1,58 @@
 from bson.objectid import ObjectId
-from flask import Flask, jsonify, request, abort, send_file
-from pymongo import MongoClient
-from pymongo.errors import DuplicateKeyError, ConnectionFailure
+from flask import Flask, jsonify, request, abort, send_file, Response, stream_with_context, make_response
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, ConnectionFailure, OperationFailure, BulkWriteError
 import config
 import uuid
 import jwt
-import bcrypt
 import datetime
 import logging
 import os
-import json
 import csv
 import io
 import re
+import threading
+import time
 from functools import wraps
 from flask_cors import CORS
 # from flask_limiter import Limiter
 # from flask_limiter.util import get_remote_address
 # from flask_compress import Compress
 from werkzeug.utils import secure_filename
+from pagination import (
+    PATIENT_SORT_FIELDS, MAX_PAGE_SIZE, InvalidCursor, fetch_keyset_page
+)
+from json_provider import MongoJSONProvider
+from exporters import (
+    EXPORT_FORMATS, PATIENT_EXPORT_COLUMNS, APPOINTMENT_EXPORT_COLUMNS, AUDIT_LOG_EXPORT_COLUMNS,
+    CURSOR_BATCH_SIZE,
+    export_stream, export_filename
+)
+from patient_import import IMPORT_FORMATS, detect_format, iter_rows, import_rows
+from response_cache import ResponseCache
+from analytics_cache import AnalyticsCache, STALE
+from token_cache import TokenCache, RevokedToken
+from password_hashing import HashingExecutor, HashingBusy
+from audit_writer import AuditWriter
+from appointment_time import (
+    START_AT_FIELD, APPOINTMENT_SLOT_INDEX, APPOINTMENT_SLOT_KEYS, start_at, normalize_date, normalize_time, touches_schedule,
+    backfill_start_at, normalize_appointment_times
+)
+from dashboard_stats import (
+    APPOINTMENT_DASHBOARD_INDEX, PATIENT_DASHBOARD_INDEX, collection_totals, doctor_stats,
+    doctor_stats_from_counters, totals_from_counters
+)
+from stats_counters import StatsCounters
+from revenue_rollups import RevenueRollups, parse_month
+from system_stats import collection_storage_stats, server_cache_stats
+from backup_jobs import BackupJobs, BackupInProgress, BackupsUnavailable, UnsupportedCompression
+from cohort_engine import GROUP_BY_OPTIONS, CohortEngine, CohortUnavailable, InvalidCohortQuery
+from availability import SLOT_TIMES, MAX_RANGE_DAYS, AvailabilityCache, date_range, free_slots
+from projection import PATIENT_COVERING_INDEXES, InvalidFields, parse_fields
+from search_index import (
+    SEARCH_TOKENS_FIELD, build_search_tokens, search_filter, touches_search_fields,
+    search_projection, backfill_search_tokens
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +61,9 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config.from_object(config)
 
+# Encode ObjectId/datetime/Decimal128 in every JSON response (orjson-backed when installed)
+app.json = MongoJSONProvider(app)
+
 # Initialize extensions
 CORS(app)
 # Compress(app)
@@ -46,6 +83,45 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Serialized responses for patient reads, invalidated by patient writes
+response_cache = ResponseCache(
+    max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=config.RESPONSE_CACHE_MAX_BYTES,
+    ttl_seconds=config.RESPONSE_CACHE_TTL
+)
+PATIENT_LIST_TAG = 'patients:list'
+
+# Analytics responses, refreshed in the background once stale
+analytics_cache = AnalyticsCache(
+    max_entries=config.ANALYTICS_CACHE_MAX_ENTRIES,
+    max_stale_seconds=config.ANALYTICS_CACHE_MAX_STALE
+)
+
+# bcrypt runs on a capped pool so login bursts cannot starve other requests
+hashing_executor = HashingExecutor(
+    max_concurrency=config.BCRYPT_MAX_CONCURRENCY,
+    max_queue=config.BCRYPT_MAX_QUEUE,
+    timeout_seconds=config.BCRYPT_QUEUE_TIMEOUT
+)
+
+def calibrate_password_hashing():
+    """Log the real per-hash latency for BCRYPT_LOG_ROUNDS on this host"""
+    try:
+        result = hashing_executor.calibrate(config.BCRYPT_LOG_ROUNDS)
+        logger.info(f"bcrypt cost {result['rounds']}: {result['medianMs']} ms per hash, "
+                    f"~{result['maxLoginsPerSecond']} logins/s with {hashing_executor.max_concurrency} workers")
+    except Exception as e:
+        logger.error(f"bcrypt calibration failed: {e}")
+
+if config.BCRYPT_CALIBRATE_ON_STARTUP:
+    threading.Thread(target=calibrate_password_hashing, name='bcrypt-calibration', daemon=True).start()
+
+# Booked-slot bitmaps per (date, doctor) for the availability endpoint
+availability_cache = AvailabilityCache(
+    max_entries=config.AVAILABILITY_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.AVAILABILITY_CACHE_TTL
+)
+
 # ------------------------
 # Utility Functions
 # ------------------------
@@ -61,8 +137,12 @@ def validate_phone(phone):
     pattern = r'^\+?1?\d{9,15}$'
     return re.match(pattern, phone) is not None
 
-def log_audit(action, user_id, details):
-    """Log audit trail for security and compliance"""
+def log_audit(action, user_id, details, durable=None):
+    """Log audit trail for security and compliance.
+
+    Entries go through the background audit writer unless ``durable`` (default
+    AUDIT_DURABLE) asks for the write to complete before the response is sent.
+    """
     audit_entry = {
         'action': action,
         'user_id': user_id,
@@ -71,7 +151,25 @@ def log_audit(action, user_id, details):
         'user_agent': request.headers.get('User-Agent'),
         'details': details
     }
-    db['audit_logs'].insert_one(audit_entry)
+    if durable is None:
+        durable = config.AUDIT_DURABLE
+    audit_writer.write(audit_entry, durable=durable)
+
+def streaming_export(cursor, prefix, columns, default_format='csv'):
+    """Stream a cursor as a CSV/NDJSON attachment based on the format/gzip query args"""
+    export_format = request.args.get('format', default_format).lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    documents = cursor.batch_size(CURSOR_BATCH_SIZE)
+    body = export_stream(documents, export_format, columns, app.json.dumps, gzip=gzip)
+    headers = {
+        'Content-Disposition': f'attachment; filename="{export_filename(prefix, export_format, gzip)}"',
+        'Cache-Control': 'no-store'
+    }
+    mimetype = 'application/gzip' if gzip else EXPORT_FORMATS[export_format][0]
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
 
 def generate_patient_id():
     """Generate unique patient ID"""
@@ -81,6 +179,10 @@ def generate_patient_id():
 # Auth Decorators
 # ------------------------
 
+def decode_token(token):
+    """Verify a JWT signature and expiry and return its claims"""
+    return jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -94,8 +196,11 @@ def token_required(f):
             return jsonify({'error': 'Invalid token format'}), 401
 
         try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+            data = token_cache.verify(token, decode_token)
             request.user = data
+            request.token = token
+        except RevokedToken:
+            return jsonify({'error': 'Token revoked'}), 401
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token expired'}), 401
         except jwt.InvalidTokenError:
@@ -122,6 +227,98 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated
 
+def cached_response(*tag_templates):
+    """Serve a GET from the response cache with ETag/Last-Modified revalidation.
+
+    Tags may reference view arguments, e.g. ``'patient:{patient_id}'``. Only
+    200 responses are cached; matching If-None-Match/If-Modified-Since get a 304
+    straight from the cached entry without touching Mongo or re-serializing.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            key = request.full_path
+            entry = response_cache.get(key)
+            if entry is None:
+                generation = response_cache.generation
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = response_cache.put(
+                    key,
+                    response.get_data(),
+                    response.mimetype,
+                    last_modified=response.last_modified,
+                    tags=[t.format(**kwargs) for t in tag_templates],
+                    generation=generation
+                )
+
+            response = Response(entry.body, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+            if entry.last_modified:
+                response.last_modified = entry.last_modified
+            # Clients may keep the body but must revalidate before reusing it
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response.make_conditional(request)
+        return wrapped
+    return decorator
+
+def analytics_cached(endpoint, ttl, tags=(), per_user=False):
+    """Serve an analytics GET from the analytics cache (place under the auth decorators).
+
+    Keys cover the endpoint, caller role (and user when per_user), view
+    arguments and query parameters. Stale bodies are returned immediately while
+    one background refresh recomputes them; ``tags`` name the collections
+    whose writes invalidate the entry.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            user = request.user
+            key = (
+                endpoint,
+                user.get('role'),
+                user.get('user_id') if per_user else None,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True)))
+            )
+
+            def compute():
+                generation = analytics_cache.generation
+                started = time.perf_counter()
+                response = make_response(f(*args, **kwargs))
+                analytics_cache.record_compute(endpoint, time.perf_counter() - started)
+                if response.status_code != 200:
+                    return response
+                return analytics_cache.store(key, response.get_data(), response.mimetype, ttl, tags, generation)
+
+            path = request.full_path
+
+            def refresh():
+                with app.test_request_context(path):
+                    request.user = user
+                    compute()
+
+            entry, state = analytics_cache.lookup(key)
+            if state == STALE:
+                analytics_cache.refresh_async(key, refresh)
+            if entry is None:
+                entry = compute()
+                if isinstance(entry, Response):
+                    return entry
+
+            response = Response(entry.body, mimetype=entry.mimetype)
+            response.headers['Age'] = str(int(entry.age()))
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapped
+    return decorator
+
+def latest_update(documents):
+    """Newest updatedAt among documents, for Last-Modified headers"""
+    timestamps = [d['updatedAt'] for d in documents if isinstance(d.get('updatedAt'), datetime.datetime)]
+    return max(timestamps) if timestamps else None
+
 # MongoDB Connection
 try:
     client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
@@ -139,6 +336,92 @@ appointments_collection = db['appointments']
 medical_records_collection = db['medical_records']
 audit_logs_collection = db['audit_logs']
 notifications_collection = db['notifications']
+revoked_tokens_collection = db['revoked_tokens']
+
+# Verified JWT claims, so repeat requests skip HMAC verification; logouts are shared via
+# revoked_tokens and reach other workers within TOKEN_REVOCATION_SYNC_SECONDS
+token_cache = TokenCache(
+    max_entries=config.TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.TOKEN_CACHE_TTL,
+    revocations=revoked_tokens_collection,
+    revocation_sync_seconds=config.TOKEN_REVOCATION_SYNC_SECONDS
+)
+
+# Dashboard totals kept current with $inc and rebuilt from source in the background
+stats_counters = StatsCounters(
+    db['stats_counters'],
+    {'patients': patients_collection, 'users': users_collection, 'appointments': appointments_collection},
+    reconcile_interval=config.COUNTERS_RECONCILE_INTERVAL
+)
+
+# Closed-month revenue totals; only the open month is aggregated per request
+revenue_rollups = RevenueRollups(db['revenue_monthly'], patients_collection)
+
+# Backups stream each collection to compressed Extended JSON in the background
+backup_jobs = BackupJobs(
+    db['backup_jobs'],
+    db,
+    directory=config.BACKUP_DIR,
+    batch_size=config.BACKUP_BATCH_SIZE,
+    stale_seconds=config.BACKUP_STALE_SECONDS
+)
+BACKUP_COLLECTIONS = {
+    'patients': None,
+    'users': {'password': 0},
+    'appointments': None,
+    'medical_records': None
+}
+
+# Columnar patient snapshot for cohort analytics (per worker process)
+cohort_engine = CohortEngine(
+    patients_collection,
+    tombstones=db['patient_tombstones'],
+    refresh_interval=config.COHORT_REFRESH_INTERVAL,
+    full_rebuild_interval=config.COHORT_FULL_REBUILD_INTERVAL
+)
+
+# Booking conflicts are caught by the unique APPOINTMENT_SLOT_INDEX on (date, time, doctor_id)
+SLOT_TAKEN_MESSAGE = "This time slot is already booked. Please choose another time."
+INVALID_TIME_MESSAGE = "Invalid time format (expected e.g. 09:30 AM)"
+INVALID_DATE_MESSAGE = "Invalid date format (expected YYYY-MM-DD)"
+# False until the unique slot index exists; bookings then fall back to a (racy) pre-check
+appointment_slot_index_ready = False
+
+def ensure_appointment_slot_index():
+    """Create the unique slot index; returns whether bookings are protected by it"""
+    global appointment_slot_index_ready
+    try:
+        appointments_collection.create_index(
+            APPOINTMENT_SLOT_KEYS, unique=True, name=APPOINTMENT_SLOT_INDEX, background=True
+        )
+        appointment_slot_index_ready = True
+        logger.info("Appointment slot index created successfully")
+    except Exception as e:
+        appointment_slot_index_ready = False
+        logger.critical(
+            f"Unique appointment slot index is MISSING ({e}). Double bookings are only prevented by a "
+            "non-atomic pre-check until duplicate bookings are resolved and maintenance (or "
+            "migrate_appointment_start_at.py) rebuilds the index."
+        )
+    return appointment_slot_index_ready
+
+def slot_taken(date, time, doctor_id, exclude_id=None):
+    """Pre-check used only while the unique slot index is missing"""
+    if appointment_slot_index_ready:
+        return False
+    query = {'date': date, 'time': time, 'doctor_id': doctor_id}
+    if exclude_id is not None:
+        query['_id'] = {'$ne': exclude_id}
+    return appointments_collection.find_one(query, {'_id': 1}) is not None
+
+# Batched background writes for log_audit
+audit_writer = AuditWriter(
+    audit_logs_collection,
+    max_queue=config.AUDIT_QUEUE_SIZE,
+    batch_size=config.AUDIT_BATCH_SIZE,
+    flush_interval=config.AUDIT_FLUSH_INTERVAL,
+    enqueue_timeout=config.AUDIT_ENQUEUE_TIMEOUT
+)
 
 # Create indexes for better performance
 def create_database_indexes():
@@ -150,7 +433,64 @@ def create_database_indexes():
         patients_collection.create_index("phone", background=True)
         patients_collection.create_index("email", background=True)
         patients_collection.create_index("createdAt", background=True)
-        
+
+        # Compound (sort key, _id) indexes back every allowed patient sortBy
+        # so both keyset and page/limit listing can walk an index in order
+        # (createdAt's index is widened to cover the staff portal table columns)
+        for sort_field in PATIENT_SORT_FIELDS:
+            keys = PATIENT_COVERING_INDEXES.get(sort_field, [(sort_field, 1), ("_id", 1)])
+            patients_collection.create_index(keys, background=True)
+
+        # Multikey index over the name/email/phone edge n-grams used by search
+        patients_collection.create_index(SEARCH_TOKENS_FIELD, background=True)
+
+        # Advanced search: equality filters first, then the createdAt sort
+        patients_collection.create_index([("status", 1), ("gender", 1), ("createdAt", -1)], background=True)
+        patients_collection.create_index([("gender", 1), ("createdAt", -1)], background=True)
+        patients_collection.create_index([("medicalHistory", 1), ("createdAt", -1)], background=True)
+        patients_collection.create_index([("age", 1), ("createdAt", -1)], background=True)
+
+        # Audit logs expire through a TTL index instead of bulk deletes; a failure
+        # here must not skip the indexes below
+        try:
+            ensure_audit_log_retention()
+        except Exception as retention_error:
+            logger.error(f"Could not apply audit log retention: {retention_error}")
+
+        # Audit log queries: filter key, then timestamp with _id as the keyset tiebreaker
+        # (the TTL index is single-field, so unfiltered listing gets its own compound)
+        audit_logs_collection.create_index([("action", 1), ("timestamp", -1), ("_id", -1)], background=True)
+        audit_logs_collection.create_index([("user_id", 1), ("timestamp", -1), ("_id", -1)], background=True)
+        audit_logs_collection.create_index([("timestamp", -1), ("_id", -1)], background=True)
+
+        # One appointment per (date, time, doctor) slot; bookings rely on this to be atomic
+        ensure_appointment_slot_index()
+
+        # Chronological listing and calendar range queries on the derived startAt
+        appointments_collection.create_index([(START_AT_FIELD, 1), ("_id", 1)], background=True)
+        appointments_collection.create_index([("doctor_id", 1), (START_AT_FIELD, 1)], background=True)
+
+        # Dashboard and doctor stats: per-doctor status counts and assigned patients
+        appointments_collection.create_index(APPOINTMENT_DASHBOARD_INDEX, background=True)
+        patients_collection.create_index(PATIENT_DASHBOARD_INDEX, background=True)
+
+        # Revoked tokens disappear once the token itself has expired
+        revoked_tokens_collection.create_index("expiresAt", expireAfterSeconds=0, background=True)
+        # Each worker's periodic sync reads the revocations recorded since its last pass
+        revoked_tokens_collection.create_index("revokedAt", background=True)
+
+        # Doctor performance: page through doctors by name, then count per doctor by date range
+        users_collection.create_index([("role", 1), ("name", 1), ("_id", 1)], background=True)
+
+        # Deleted patients, read by every worker's cohort snapshot refresh
+        cohort_engine.ensure_indexes()
+
+        # At most one backup job runs at a time; without this index backups are refused (503)
+        try:
+            backup_jobs.ensure_indexes()
+        except Exception as backup_index_error:
+            logger.critical(f"Backup job indexes missing, backups disabled until they build: {backup_index_error}")
+
         # Clean up users with null emails before creating unique index
         cleanup_null_email_users()
         
@@ -171,6 +511,35 @@ def create_database_indexes():
     except Exception as e:
         logger.error(f"Error creating indexes: {e}")
 
+def ensure_audit_log_retention():
+    """Create or retune the TTL index that expires audit logs after AUDIT_RETENTION_DAYS.
+
+    MongoDB's TTL monitor deletes expired entries in small background batches,
+    so retention never needs a large delete inside a request.
+    """
+    if config.AUDIT_RETENTION_DAYS <= 0:
+        # A TTL index left by an earlier setting would keep deleting logs
+        for name, info in audit_logs_collection.index_information().items():
+            if 'expireAfterSeconds' in info:
+                audit_logs_collection.drop_index(name)
+                logger.info(f"Dropped audit log TTL index {name}; audit logs are kept forever")
+        logger.info("Audit log retention disabled (AUDIT_RETENTION_DAYS <= 0)")
+        return None
+
+    expire_after = config.AUDIT_RETENTION_DAYS * 24 * 60 * 60
+    try:
+        audit_logs_collection.create_index(
+            "timestamp", expireAfterSeconds=expire_after, background=True
+        )
+    except OperationFailure as e:
+        # An index on timestamp already exists with other options: retune it in place
+        if e.code not in (85, 86):  # IndexOptionsConflict / IndexKeySpecsConflict
+            raise
+        db.command("collMod", audit_logs_collection.name,
+                   index={"keyPattern": {"timestamp": 1}, "expireAfterSeconds": expire_after})
+        logger.info(f"Updated audit log TTL to {config.AUDIT_RETENTION_DAYS} days")
+    return config.AUDIT_RETENTION_DAYS
+
 def cleanup_null_email_users():
     """Clean up users with null or missing email values"""
     try:
@@ -238,6 +607,20 @@ def cleanup_null_email_users():
 # Create indexes
 create_database_indexes()
 
+# Catch the dashboard counters up with writes made while the app was down
+stats_counters.request_reconcile()
+
+def backfill_missing_search_tokens():
+    """Give patients stored before the search token index their tokens so search can find them"""
+    try:
+        updated = backfill_search_tokens(patients_collection, only_missing=True)
+        if updated:
+            logger.info(f"Built search tokens for {updated} patients")
+    except Exception as e:
+        logger.error(f"Search token backfill failed, run build_search_index.py: {e}")
+
+threading.Thread(target=backfill_missing_search_tokens, name='search-token-backfill', daemon=True).start()
+
 # ------------------------
 # Auth Routes
 # ------------------------
@@ -269,7 +652,7 @@ def register():
             return jsonify({"error": "Email already exists"}), 409
 
         # Hash password with configurable rounds
-        hashed_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(config.BCRYPT_LOG_ROUNDS))
+        hashed_pw = hashing_executor.hash_password(password, config.BCRYPT_LOG_ROUNDS)
         
         user = {
             "name": name,
@@ -282,6 +665,8 @@ def register():
         }
 
         result = users_collection.insert_one(user)
+        stats_counters.apply('user', after=user)
+        analytics_cache.invalidate('users')
         
         # Generate token for immediate login
         token = jwt.encode({
@@ -302,6 +687,8 @@ def register():
             },
             "message": "User registered successfully"
         }), 201
+    except HashingBusy:
+        return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
     except Exception as e:
         logger.error(f"Registration error: {e}")
         return jsonify({"error": "Registration failed"}), 500
@@ -318,7 +705,7 @@ def login():
 
         user = users_collection.find_one({"email": email})
 
-        if user and bcrypt.checkpw(password.encode('utf-8'), user['password']):
+        if user and hashing_executor.check_password(password, user['password']):
             token = jwt.encode({
                 'user_id': str(user['_id']),
                 'email': user['email'],
@@ -339,78 +726,121 @@ def login():
             })
 
         return jsonify({"message": "Invalid credentials"}), 401
+    except HashingBusy:
+        return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
     except Exception as e:
         logger.error(f"Login error: {e}")
         return jsonify({"error": "Login failed"}), 500
 
+@app.route('/api/auth/logout', methods=['POST'])
+@token_required
+def logout():
+    try:
+        # Revoked for every worker until the token would have expired anyway
+        token_cache.revoke(request.token, expires_at=request.user.get('exp'))
+        return jsonify({"message": "Logged out successfully"})
+    except Exception as e:
+        logger.error(f"Logout error: {e}")
+        return jsonify({"error": "Failed to revoke token"}), 500
+
 # ------------------------
 # Patient Routes
 # ------------------------
 
-@app.route('/api/patients', methods=['GET'])
-@token_required
-def get_patients():
-    page = int(request.args.get('page', 1))
+# Fields never returned by patient read endpoints
+PATIENT_PROJECTION = {'password': 0, SEARCH_TOKENS_FIELD: 0}
+
+def build_patient_search_filter(search):
+    """Build the patient filter for the list endpoints' search parameter"""
+    return search_filter(search)
+
+def list_patients(total_key):
+    """Shared handler for the patient list endpoints.
+
+    Passing a ``cursor`` query parameter (empty for the first page) switches to
+    keyset pagination; otherwise the legacy page/limit mode is used. ``fields``
+    limits the returned fields (see projection.FIELD_ALLOW_LISTS).
+    """
     limit = int(request.args.get('limit', 10))
     search = request.args.get('search', '')
     sort_by = request.args.get('sortBy', 'createdAt')
     sort_order = request.args.get('sortOrder', 'desc')
-    
-    skip = (page - 1) * limit
+    cursor_mode = 'cursor' in request.args
+
+    if sort_by not in PATIENT_SORT_FIELDS:
+        return jsonify({"error": f"sortBy must be one of: {', '.join(PATIENT_SORT_FIELDS)}"}), 400
+
+    try:
+        # Keyset cursors are built from the sort key, so it must be projected
+        projection = parse_fields(
+            request.args.get('fields'), 'patients', required=(sort_by,) if cursor_mode else ()
+        ) or PATIENT_PROJECTION
+    except InvalidFields as e:
+        return jsonify({"error": str(e)}), 400
+
     sort_direction = -1 if sort_order == 'desc' else 1
-    
-    # Build search filter
-    search_filter = {}
-    if search:
-        search_filter = {
-            '$or': [
-                {'firstName': {'$regex': search, '$options': 'i'}},
-                {'lastName': {'$regex': search, '$options': 'i'}},
-                {'email': {'$regex': search, '$options': 'i'}},
-                {'phone': {'$regex': search, '$options': 'i'}}
-            ]
+    search_filter = build_patient_search_filter(search)
+
+    if cursor_mode:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        try:
+            patients, next_cursor = fetch_keyset_page(
+                patients_collection,
+                search_filter,
+                sort_by,
+                sort_direction,
+                limit,
+                cursor=request.args.get('cursor'),
+                projection=projection
+            )
+        except InvalidCursor as e:
+            return jsonify({"error": str(e)}), 400
+        page_info = {
+            "limit": limit,
+            "nextCursor": next_cursor,
+            "hasMore": next_cursor is not None
+        }
+    else:
+        page = int(request.args.get('page', 1))
+        skip = (page - 1) * limit
+
+        # Get total count
+        total = patients_collection.count_documents(search_filter)
+
+        # Get patients with pagination and sorting
+        patients = list(patients_collection.find(
+            search_filter,
+            projection
+        ).sort([(sort_by, sort_direction), ('_id', sort_direction)]).skip(skip).limit(limit))
+        page_info = {
+            total_key: total,
+            "page": page,
+            "limit": limit,
+            "totalPages": (total + limit - 1) // limit
         }
-    
-    # Get total count
-    total = patients_collection.count_documents(search_filter)
-    
-    # Get patients with pagination and sorting
-    patients = list(patients_collection.find(
-        search_filter,
-        {'password': 0}  # Exclude password field
-    ).sort(sort_by, sort_direction).skip(skip).limit(limit))
-    
-    # Convert ObjectId to string for JSON serialization
-    for patient in patients:
-        patient['_id'] = str(patient['_id'])
-        if 'createdAt' in patient:
-            patient['createdAt'] = patient['createdAt'].isoformat()
-        if 'updatedAt' in patient:
-            patient['updatedAt'] = patient['updatedAt'].isoformat()
-    
-    return jsonify({
-        "patients": patients,
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "totalPages": (total + limit - 1) // limit
-    })
+
+    response = jsonify({"patients": patients, **page_info})
+    response.last_modified = latest_update(patients)
+    return response
+
+@app.route('/api/patients', methods=['GET'])
+@token_required
+@cached_response(PATIENT_LIST_TAG)
+def get_patients():
+    return list_patients('total')
 
 @app.route('/api/patients/<patient_id>', methods=['GET'])
 @token_required
+@cached_response('patient:{patient_id}')
 def get_patient(patient_id):
     try:
-        patient = patients_collection.find_one({"_id": ObjectId(patient_id)})
+        patient = patients_collection.find_one({"_id": ObjectId(patient_id)}, PATIENT_PROJECTION)
         if not patient:
             return jsonify({"message": "Patient not found"}), 404
         
-        patient['_id'] = str(patient['_id'])
-        if 'createdAt' in patient:
-            patient['createdAt'] = patient['createdAt'].isoformat()
-        if 'updatedAt' in patient:
-            patient['updatedAt'] = patient['updatedAt'].isoformat()
-        
-        return jsonify(patient)
+        response = jsonify(patient)
+        response.last_modified = latest_update([patient])
+        return response
     except Exception as e:
         return jsonify({"message": "Invalid patient ID"}), 400
 
@@ -422,8 +852,15 @@ def create_patient():
     # Add timestamps
     data['createdAt'] = datetime.datetime.utcnow()
     data['updatedAt'] = datetime.datetime.utcnow()
+
+    # Index name/email/phone for search
+    data[SEARCH_TOKENS_FIELD] = build_search_tokens(data)
     
     result = patients_collection.insert_one(data)
+    response_cache.invalidate(PATIENT_LIST_TAG)
+    stats_counters.apply('patient', after=data)
+    analytics_cache.invalidate('patients')
+    cohort_engine.mark_stale()
     
     return jsonify({
         "message": "Patient created successfully",
@@ -435,16 +872,38 @@ def create_patient():
 def update_patient(patient_id):
     try:
         update_data = request.json
+        update_data.pop(SEARCH_TOKENS_FIELD, None)
         update_data['updatedAt'] = datetime.datetime.utcnow()
-        
-        result = patients_collection.update_one(
-            {"_id": ObjectId(patient_id)},
-            {"$set": update_data}
-        )
-
-        if result.matched_count == 0:
-            return jsonify({"message": "Patient not found"}), 404
 
+        # Rebuild search tokens from the merged document when searchable fields change
+        if touches_search_fields(update_data):
+            current = patients_collection.find_one({"_id": ObjectId(patient_id)}, search_projection())
+            if not current:
+                return jsonify({"message": "Patient not found"}), 404
+            current.update(update_data)
+            update_data[SEARCH_TOKENS_FIELD] = build_search_tokens(current)
+        
+        if 'assigned_doctor' in update_data:
+            # Reassignment moves the patient between doctor counters
+            previous = patients_collection.find_one_and_update(
+                {"_id": ObjectId(patient_id)},
+                {"$set": update_data},
+                projection={'assigned_doctor': 1}
+            )
+            if previous is None:
+                return jsonify({"message": "Patient not found"}), 404
+            stats_counters.apply('patient', previous, {**previous, **update_data})
+        else:
+            result = patients_collection.update_one(
+                {"_id": ObjectId(patient_id)},
+                {"$set": update_data}
+            )
+            if result.matched_count == 0:
+                return jsonify({"message": "Patient not found"}), 404
+
+        response_cache.invalidate(PATIENT_LIST_TAG, f'patient:{patient_id}')
+        analytics_cache.invalidate('patients')
+        cohort_engine.mark_stale()
         return jsonify({"message": "Patient updated successfully"})
     except Exception as e:
         return jsonify({"message": "Invalid patient ID"}), 400
@@ -453,19 +912,158 @@ def update_patient(patient_id):
 @token_required
 def delete_patient(patient_id):
     try:
-        result = patients_collection.delete_one({"_id": ObjectId(patient_id)})
+        deleted = patients_collection.find_one_and_delete(
+            {"_id": ObjectId(patient_id)},
+            projection={'assigned_doctor': 1, 'createdAt': 1}
+        )
 
-        if result.deleted_count == 0:
+        if deleted is None:
             return jsonify({"message": "Patient not found"}), 404
 
+        response_cache.invalidate(PATIENT_LIST_TAG, f'patient:{patient_id}')
+        stats_counters.apply('patient', before=deleted)
+        analytics_cache.invalidate('patients')
+        cohort_engine.remove(patient_id)
+        revenue_rollups.patient_removed(deleted.get('createdAt'))
         return jsonify({"message": "Patient deleted successfully"})
     except Exception as e:
         return jsonify({"message": "Invalid patient ID"}), 400
 
+@app.route('/api/patients/export', methods=['GET'])
+@token_required
+def export_patients():
+    try:
+        sort_by = request.args.get('sortBy', 'createdAt')
+        if sort_by not in PATIENT_SORT_FIELDS:
+            return jsonify({"error": f"sortBy must be one of: {', '.join(PATIENT_SORT_FIELDS)}"}), 400
+        sort_direction = -1 if request.args.get('sortOrder', 'desc') == 'desc' else 1
+
+        cursor = patients_collection.find(
+            build_patient_search_filter(request.args.get('search', '')),
+            PATIENT_PROJECTION
+        ).sort([(sort_by, sort_direction), ('_id', sort_direction)])
+
+        response = streaming_export(cursor, 'patients', PATIENT_EXPORT_COLUMNS)
+        if isinstance(response, Response):
+            log_audit('patients_exported', request.user['user_id'], {
+                'search': request.args.get('search', ''),
+                'format': request.args.get('format', 'csv')
+            })
+        return response
+    except Exception as e:
+        logger.error(f"Patient export error: {e}")
+        return jsonify({"error": "Failed to export patients"}), 500
+
+# Fields an import row may not set directly
+IMPORT_PROTECTED_FIELDS = ('_id', 'password', SEARCH_TOKENS_FIELD, 'createdAt', 'updatedAt')
+
+def prepare_patient_import_row(row):
+    """Validate one import row and build the patient document, or return an error string"""
+    document = {}
+    for key, value in row.items():
+        if key in IMPORT_PROTECTED_FIELDS:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ('', None):
+            continue
+        document[key] = value
+
+    for field in ('firstName', 'lastName'):
+        if not document.get(field):
+            return f"{field} is required"
+
+    if 'email' in document:
+        document['email'] = str(document['email']).lower()
+        if not validate_email(document['email']):
+            return "Invalid email format"
+
+    if 'phone' in document:
+        document['phone'] = re.sub(r'[\s\-()]', '', str(document['phone']))
+        if not validate_phone(document['phone']):
+            return "Invalid phone number format"
+
+    if 'age' in document:
+        try:
+            document['age'] = int(document['age'])
+        except (TypeError, ValueError):
+            return "age must be a whole number"
+
+    # CSV exports join list fields with "; "
+    if isinstance(document.get('medicalHistory'), str):
+        document['medicalHistory'] = [h.strip() for h in document['medicalHistory'].split(';') if h.strip()]
+
+    now = datetime.datetime.utcnow()
+    document['createdAt'] = now
+    document['updatedAt'] = now
+    document[SEARCH_TOKENS_FIELD] = build_search_tokens(document)
+    return document
+
+@app.route('/api/patients/import', methods=['POST'])
+@token_required
+def import_patients():
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "No file provided"}), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+
+        import_format = detect_format(file.filename, request.form.get('format') or request.args.get('format'))
+        if import_format not in IMPORT_FORMATS:
+            return jsonify({"error": f"format must be one of: {', '.join(IMPORT_FORMATS)}"}), 400
+
+        try:
+            batch_size = int(request.form.get('batchSize') or request.args.get('batchSize') or config.IMPORT_BATCH_SIZE)
+        except ValueError:
+            return jsonify({"error": "batchSize must be a number"}), 400
+        batch_size = max(1, min(batch_size, config.IMPORT_MAX_BATCH_SIZE))
+
+        report = import_rows(
+            patients_collection,
+            iter_rows(file.stream, import_format),
+            prepare_patient_import_row,
+            batch_size
+        ).to_dict()
+        if report['inserted']:
+            response_cache.invalidate(PATIENT_LIST_TAG)
+            # Totals now; per-doctor assignments are picked up by the next rebuild
+            stats_counters.increment({'totals': {'patients': report['inserted']}})
+            stats_counters.request_reconcile()
+            analytics_cache.invalidate('patients')
+            cohort_engine.mark_stale()
+
+        log_audit('patients_imported', request.user['user_id'], {
+            'filename': secure_filename(file.filename),
+            'format': import_format,
+            'rows': report['rowsProcessed'],
+            'inserted': report['inserted'],
+            'failed': report['failed']
+        })
+
+        return jsonify({"message": "Import completed", "batchSize": batch_size, **report})
+    except UnicodeDecodeError:
+        return jsonify({"error": "File must be UTF-8 encoded"}), 400
+    except Exception as e:
+        logger.error(f"Patient import error: {e}")
+        return jsonify({"error": "Failed to import patients"}), 500
+
 # ------------------------
 # Appointment Routes
 # ------------------------
 
+def build_appointment_filter(args):
+    """Build the appointment filter shared by the list and export endpoints"""
+    filter_query = {}
+    if args.get('date'):
+        filter_query['date'] = normalize_date(args['date']) or args['date']
+    if args.get('doctor'):
+        filter_query['doctor_id'] = args['doctor']
+    if args.get('status'):
+        filter_query['status'] = args['status']
+    return filter_query
+
 @app.route('/api/appointments', methods=['POST'])
 def create_appointment():
     try:
@@ -486,36 +1084,46 @@ def create_appointment():
         # Validate phone format
         if not validate_phone(data['phone']):
             return jsonify({"error": "Invalid phone number format"}), 400
+
+        # One spelling per slot, so '12/31/2099 9:30 am' and '2099-12-31 09:30' hit the same unique index key
+        slot_date = normalize_date(data['date'])
+        if slot_date is None:
+            return jsonify({"error": INVALID_DATE_MESSAGE}), 400
+        slot_time = normalize_time(data['time'])
+        if slot_time is None:
+            return jsonify({"error": INVALID_TIME_MESSAGE}), 400
         
-        # Check if appointment slot is available (basic check)
-        existing_appointment = appointments_collection.find_one({
-            'date': data['date'],
-            'time': data['time']
-        })
-        
-        if existing_appointment:
-            return jsonify({"error": "This time slot is already booked. Please choose another time."}), 409
-        
-        # Create appointment record
+        # Create appointment record; the unique slot index rejects a taken
+        # (date, time, doctor) slot, so check and booking are one atomic insert
         appointment_data = {
             'name': data['name'],
             'phone': data['phone'],
             'email': data['email'],
-            'date': data['date'],
-            'time': data['time'],
+            'date': slot_date,
+            'time': slot_time,
+            'doctor_id': data.get('doctor_id') or None,
+            START_AT_FIELD: start_at(slot_date, slot_time),
             'status': 'pending',
             'createdAt': datetime.datetime.utcnow(),
             'updatedAt': datetime.datetime.utcnow()
         }
         
-        result = appointments_collection.insert_one(appointment_data)
+        if slot_taken(slot_date, slot_time, appointment_data['doctor_id']):
+            return jsonify({"error": SLOT_TAKEN_MESSAGE}), 409
+        try:
+            result = appointments_collection.insert_one(appointment_data)
+        except DuplicateKeyError:
+            return jsonify({"error": SLOT_TAKEN_MESSAGE}), 409
+        availability_cache.invalidate(appointment_data)
+        stats_counters.apply('appointment', after=appointment_data)
+        analytics_cache.invalidate('appointments')
         
         # Log audit
         log_audit('appointment_created', 'public', {
             'appointment_id': str(result.inserted_id),
             'patient_name': data['name'],
-            'date': data['date'],
-            'time': data['time']
+            'date': slot_date,
+            'time': slot_time
         })
         
         return jsonify({
@@ -524,8 +1132,8 @@ def create_appointment():
             "appointment": {
                 "id": str(result.inserted_id),
                 "name": data['name'],
-                "date": data['date'],
-                "time": data['time'],
+                "date": slot_date,
+                "time": slot_time,
                 "status": "pending"
             }
         }), 201
@@ -534,6 +1142,93 @@ def create_appointment():
         logger.error(f"Appointment creation error: {e}")
         return jsonify({"error": "Failed to book appointment"}), 500
 
+@app.route('/api/appointments/availability', methods=['GET'])
+def get_availability():
+    """Free slots per day for a date range, per doctor (doctor=id[,id...]) or for general bookings"""
+    try:
+        try:
+            start = datetime.date.fromisoformat(request.args.get('from') or datetime.date.today().isoformat())
+            end = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else start + datetime.timedelta(days=6)
+        except ValueError:
+            return jsonify({"error": "from/to must be YYYY-MM-DD dates"}), 400
+        if end < start or (end - start).days >= MAX_RANGE_DAYS:
+            return jsonify({"error": f"Date range must be 1-{MAX_RANGE_DAYS} days"}), 400
+
+        # Appointments booked without a doctor are stored with doctor_id null
+        doctor_ids = [d.strip() for d in request.args.get('doctor', '').split(',') if d.strip()] or [None]
+        dates = date_range(start, end)
+        bitmaps = availability_cache.bitmaps(appointments_collection, dates, doctor_ids)
+
+        return jsonify({
+            "from": dates[0],
+            "to": dates[-1],
+            "slots": SLOT_TIMES,
+            "availability": [
+                {
+                    "date": date,
+                    "doctor_id": doctor_id,
+                    "bookedMask": bitmaps[(date, doctor_id)],
+                    "free": free_slots(bitmaps[(date, doctor_id)])
+                }
+                for doctor_id in doctor_ids for date in dates
+            ]
+        })
+    except Exception as e:
+        logger.error(f"Get availability error: {e}")
+        return jsonify({"error": "Failed to fetch availability"}), 500
+
+CALENDAR_PROJECTION = {
+    'name': 1, 'date': 1, 'time': 1, START_AT_FIELD: 1, 'doctor_id': 1, 'doctor': 1,
+    'department': 1, 'status': 1
+}
+CALENDAR_MAX_DAYS = 92
+CALENDAR_MAX_RESULTS = 5000
+
+def parse_calendar_bound(value, end=False):
+    """ISO date or datetime; a bare date as the upper bound covers that whole day"""
+    if len(value) == 10:
+        day = datetime.datetime.fromisoformat(value)
+        return day + datetime.timedelta(days=1) if end else day
+    return datetime.datetime.fromisoformat(value)
+
+@app.route('/api/appointments/calendar', methods=['GET'])
+@token_required
+def get_appointment_calendar():
+    """Appointments starting in [from, to), sorted by start time, for the calendar views"""
+    try:
+        if not request.args.get('from') or not request.args.get('to'):
+            return jsonify({"error": "from and to are required"}), 400
+        try:
+            range_start = parse_calendar_bound(request.args['from'])
+            range_end = parse_calendar_bound(request.args['to'], end=True)
+        except ValueError:
+            return jsonify({"error": "from/to must be ISO 8601 dates or datetimes"}), 400
+        if range_end <= range_start or (range_end - range_start).days > CALENDAR_MAX_DAYS:
+            return jsonify({"error": f"Range must be positive and at most {CALENDAR_MAX_DAYS} days"}), 400
+
+        filter_query = {START_AT_FIELD: {'$gte': range_start, '$lt': range_end}}
+        if request.args.get('doctor'):
+            filter_query['doctor_id'] = request.args['doctor']
+        if request.args.get('status'):
+            filter_query['status'] = request.args['status']
+
+        appointments = list(
+            appointments_collection.find(filter_query, CALENDAR_PROJECTION)
+            .sort([(START_AT_FIELD, 1), ('_id', 1)])
+            .limit(CALENDAR_MAX_RESULTS + 1)
+        )
+        truncated = len(appointments) > CALENDAR_MAX_RESULTS
+
+        return jsonify({
+            "from": range_start,
+            "to": range_end,
+            "appointments": appointments[:CALENDAR_MAX_RESULTS],
+            "truncated": truncated
+        })
+    except Exception as e:
+        logger.error(f"Get appointment calendar error: {e}")
+        return jsonify({"error": "Failed to fetch calendar"}), 500
+
 @app.route('/api/appointments', methods=['GET'])
 @token_required
 def get_appointments():
@@ -547,21 +1242,18 @@ def get_appointments():
         # Build filter
         filter_query = {}
         if date_filter:
-            filter_query['date'] = date_filter
+            filter_query['date'] = normalize_date(date_filter) or date_filter
+
+        try:
+            projection = parse_fields(request.args.get('fields'), 'appointments')
+        except InvalidFields as e:
+            return jsonify({"error": str(e)}), 400
         
         # Get total count
         total = appointments_collection.count_documents(filter_query)
         
         # Get appointments with pagination
-        appointments = list(appointments_collection.find(filter_query).sort('date', 1).skip(skip).limit(limit))
-        
-        # Convert ObjectId to string for JSON serialization
-        for appointment in appointments:
-            appointment['_id'] = str(appointment['_id'])
-            if 'createdAt' in appointment:
-                appointment['createdAt'] = appointment['createdAt'].isoformat()
-            if 'updatedAt' in appointment:
-                appointment['updatedAt'] = appointment['updatedAt'].isoformat()
+        appointments = list(appointments_collection.find(filter_query, projection).sort([(START_AT_FIELD, 1), ('_id', 1)]).skip(skip).limit(limit))
         
         return jsonify({
             "appointments": appointments,
@@ -581,14 +1273,51 @@ def update_appointment(appointment_id):
     try:
         update_data = request.json
         update_data['updatedAt'] = datetime.datetime.utcnow()
+        # startAt is derived from date/time, never taken from the client
+        update_data.pop(START_AT_FIELD, None)
+        if 'date' in update_data:
+            update_data['date'] = normalize_date(update_data['date'])
+            if update_data['date'] is None:
+                return jsonify({"error": INVALID_DATE_MESSAGE}), 400
+        if 'time' in update_data:
+            update_data['time'] = normalize_time(update_data['time'])
+            if update_data['time'] is None:
+                return jsonify({"error": INVALID_TIME_MESSAGE}), 400
+        if 'date' in update_data and 'time' in update_data:
+            update_data[START_AT_FIELD] = start_at(update_data['date'], update_data['time'])
+
+        if not appointment_slot_index_ready and (touches_schedule(update_data) or 'doctor_id' in update_data):
+            existing = appointments_collection.find_one(
+                {"_id": ObjectId(appointment_id)}, {'date': 1, 'time': 1, 'doctor_id': 1}
+            )
+            if existing is not None:
+                target = {**existing, **update_data}
+                if slot_taken(target.get('date'), target.get('time'), target.get('doctor_id'), existing['_id']):
+                    return jsonify({"error": SLOT_TAKEN_MESSAGE}), 409
         
-        result = appointments_collection.update_one(
-            {"_id": ObjectId(appointment_id)},
-            {"$set": update_data}
-        )
-        
-        if result.matched_count == 0:
+        try:
+            previous = appointments_collection.find_one_and_update(
+                {"_id": ObjectId(appointment_id)},
+                {"$set": update_data},
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # Rescheduled onto a slot that is already booked
+            return jsonify({"error": SLOT_TAKEN_MESSAGE}), 409
+        
+        if previous is None:
             return jsonify({"error": "Appointment not found"}), 404
+        current = {**previous, **update_data}
+        availability_cache.invalidate(previous, current)
+        stats_counters.apply('appointment', previous, current)
+        analytics_cache.invalidate('appointments')
+
+        # Only one of date/time changed: startAt needs the other half from the stored document
+        if touches_schedule(update_data) and START_AT_FIELD not in update_data:
+            appointments_collection.update_one(
+                {"_id": previous['_id']},
+                {"$set": {START_AT_FIELD: start_at(current.get('date'), current.get('time'))}}
+            )
         
         return jsonify({"message": "Appointment updated successfully"})
         
@@ -600,10 +1329,13 @@ def update_appointment(appointment_id):
 @token_required
 def delete_appointment(appointment_id):
     try:
-        result = appointments_collection.delete_one({"_id": ObjectId(appointment_id)})
+        deleted = appointments_collection.find_one_and_delete({"_id": ObjectId(appointment_id)})
         
-        if result.deleted_count == 0:
+        if deleted is None:
             return jsonify({"error": "Appointment not found"}), 404
+        availability_cache.invalidate(deleted)
+        stats_counters.apply('appointment', before=deleted)
+        analytics_cache.invalidate('appointments')
         
         return jsonify({"message": "Appointment deleted successfully"})
         
@@ -611,6 +1343,151 @@ def delete_appointment(appointment_id):
         logger.error(f"Delete appointment error: {e}")
         return jsonify({"error": "Failed to delete appointment"}), 500
 
+BULK_UPDATE_FIELDS = frozenset({'status', 'date', 'time', 'doctor_id', 'doctor', 'department', 'reason', 'notes'})
+APPOINTMENT_STATUSES = ('pending', 'scheduled', 'confirmed', 'completed', 'cancelled')
+
+def validate_bulk_update(item, seen_ids):
+    """Return (ObjectId, fields) for one bulk operation or raise ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError("Operation must be an object")
+    # ObjectId(None) would mint a fresh id, so a missing id must be caught first
+    if not isinstance(item.get('id'), str):
+        raise ValueError("Invalid appointment id")
+    try:
+        object_id = ObjectId(item['id'])
+    except Exception:
+        raise ValueError("Invalid appointment id")
+    if object_id in seen_ids:
+        raise ValueError("Appointment appears more than once in this batch")
+    fields = {k: v for k, v in item.items() if k != 'id'}
+    if not fields:
+        raise ValueError("No fields to update")
+    unknown = sorted(set(fields) - BULK_UPDATE_FIELDS)
+    if unknown:
+        raise ValueError(f"Fields not allowed: {', '.join(unknown)}")
+    if 'status' in fields and fields['status'] not in APPOINTMENT_STATUSES:
+        raise ValueError(f"status must be one of: {', '.join(APPOINTMENT_STATUSES)}")
+    if 'date' in fields:
+        fields['date'] = normalize_date(fields['date'])
+        if fields['date'] is None:
+            raise ValueError(INVALID_DATE_MESSAGE)
+    if 'time' in fields:
+        fields['time'] = normalize_time(fields['time'])
+        if fields['time'] is None:
+            raise ValueError(INVALID_TIME_MESSAGE)
+    return object_id, fields
+
+@app.route('/api/appointments/bulk-update', methods=['POST'])
+@token_required
+def bulk_update_appointments():
+    """Apply many confirm/cancel/reschedule changes in one unordered bulk_write"""
+    try:
+        data = request.json
+        operations = data.get('operations') if isinstance(data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return jsonify({"error": "operations must be a non-empty list"}), 400
+        if len(operations) > config.BULK_UPDATE_MAX_OPERATIONS:
+            return jsonify({"error": f"At most {config.BULK_UPDATE_MAX_OPERATIONS} operations per request"}), 400
+
+        results = [None] * len(operations)
+        valid = []
+        seen_ids = set()
+        for index, item in enumerate(operations):
+            try:
+                object_id, fields = validate_bulk_update(item, seen_ids)
+            except ValueError as e:
+                results[index] = {"index": index, "id": item.get('id') if isinstance(item, dict) else None,
+                                  "status": "error", "error": str(e)}
+                continue
+            seen_ids.add(object_id)
+            valid.append((index, object_id, fields))
+
+        # One read gives existence, plus the old slot for startAt and availability
+        previous = {
+            doc['_id']: doc for doc in appointments_collection.find(
+                {'_id': {'$in': list(seen_ids)}}, {'date': 1, 'time': 1, 'doctor_id': 1, 'status': 1}
+            )
+        }
+
+        now = datetime.datetime.utcnow()
+        requests_batch = []
+        batch_items = []
+        for index, object_id, fields in valid:
+            if object_id not in previous:
+                results[index] = {"index": index, "id": str(object_id), "status": "error", "error": "Appointment not found"}
+                continue
+            update = dict(fields, updatedAt=now)
+            current = {**previous[object_id], **fields}
+            if ((touches_schedule(fields) or 'doctor_id' in fields)
+                    and slot_taken(current.get('date'), current.get('time'), current.get('doctor_id'), object_id)):
+                results[index] = {"index": index, "id": str(object_id), "status": "error", "error": SLOT_TAKEN_MESSAGE}
+                continue
+            if touches_schedule(fields):
+                update[START_AT_FIELD] = start_at(current.get('date'), current.get('time'))
+            requests_batch.append(UpdateOne({'_id': object_id}, {'$set': update}))
+            batch_items.append((index, object_id, current))
+
+        failed_positions = {}
+        if requests_batch:
+            try:
+                appointments_collection.bulk_write(requests_batch, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get('writeErrors', []):
+                    failed_positions[error['index']] = (
+                        SLOT_TAKEN_MESSAGE if error.get('code') == 11000 else error.get('errmsg', 'Update failed')
+                    )
+
+        updated_ids = []
+        counter_changes = []
+        for position, (index, object_id, current) in enumerate(batch_items):
+            if position in failed_positions:
+                results[index] = {"index": index, "id": str(object_id), "status": "error", "error": failed_positions[position]}
+                continue
+            results[index] = {"index": index, "id": str(object_id), "status": "updated"}
+            updated_ids.append(str(object_id))
+            availability_cache.invalidate(previous[object_id], current)
+            counter_changes.append((previous[object_id], current))
+        if counter_changes:
+            stats_counters.apply_many('appointment', counter_changes)
+            analytics_cache.invalidate('appointments')
+
+        failed = len(operations) - len(updated_ids)
+        log_audit('appointments_bulk_updated', request.user['user_id'], {
+            'requested': len(operations),
+            'updated': len(updated_ids),
+            'failed': failed,
+            'appointment_ids': updated_ids,
+            'fields': sorted({field for _, _, fields in valid for field in fields})
+        })
+
+        return jsonify({
+            "message": "Bulk update completed",
+            "updated": len(updated_ids),
+            "failed": failed,
+            "results": results
+        })
+    except Exception as e:
+        logger.error(f"Bulk appointment update error: {e}")
+        return jsonify({"error": "Failed to update appointments"}), 500
+
+@app.route('/api/appointments/export', methods=['GET'])
+@token_required
+def export_appointments():
+    try:
+        filter_query = build_appointment_filter(request.args)
+        cursor = appointments_collection.find(filter_query).sort([(START_AT_FIELD, 1), ('_id', 1)])
+
+        response = streaming_export(cursor, 'appointments', APPOINTMENT_EXPORT_COLUMNS)
+        if isinstance(response, Response):
+            log_audit('appointments_exported', request.user['user_id'], {
+                'filters': filter_query,
+                'format': request.args.get('format', 'csv')
+            })
+        return response
+    except Exception as e:
+        logger.error(f"Appointment export error: {e}")
+        return jsonify({"error": "Failed to export appointments"}), 500
+
 # ------------------------
 # Notifications Routes
 # ------------------------
@@ -625,10 +1502,6 @@ def get_notifications():
             "read": False
         }).sort('created_at', -1).limit(50))
         
-        for notification in notifications:
-            notification['_id'] = str(notification['_id'])
-            notification['created_at'] = notification['created_at'].isoformat()
-        
         return jsonify({"notifications": notifications})
     except Exception as e:
         logger.error(f"Get notifications error: {e}")
@@ -714,10 +1587,6 @@ def get_patient_documents(patient_id):
     try:
         documents = list(db['patient_documents'].find({"patient_id": patient_id}).sort('uploaded_at', -1))
         
-        for doc in documents:
-            doc['_id'] = str(doc['_id'])
-            doc['uploaded_at'] = doc['uploaded_at'].isoformat()
-        
         return jsonify({"documents": documents})
     except Exception as e:
         logger.error(f"Get patient documents error: {e}")
@@ -727,56 +1596,123 @@ def get_patient_documents(patient_id):
 # Advanced Search Routes
 # ------------------------
 
+# Age bucket boundaries for the advanced search facets (lower bound inclusive)
+AGE_BUCKETS = [0, 18, 30, 45, 60, 75, 200]
+
+def build_advanced_search_query(data):
+    """Translate an advanced search body into a patient filter"""
+    query = {}
+    
+    # Build complex search query; name/email/phone go through the token index
+    token_clauses = []
+    if data.get('name'):
+        token_clauses.append(search_filter(data['name'], namespaces=('n',)))
+    
+    if data.get('email'):
+        token_clauses.append(search_filter(data['email'], namespaces=('e',)))
+    
+    if data.get('phone'):
+        token_clauses.append(search_filter(data['phone'], namespaces=('p',)))
+
+    if token_clauses:
+        query['$and'] = token_clauses
+    
+    if data.get('status'):
+        query['status'] = data['status']
+    
+    if data.get('gender'):
+        query['gender'] = data['gender']
+    
+    if data.get('age_range'):
+        min_age = data['age_range'].get('min', 0)
+        max_age = data['age_range'].get('max', 120)
+        query['age'] = {'$gte': min_age, '$lte': max_age}
+    
+    if data.get('medical_history'):
+        query['medicalHistory'] = {'$in': data['medical_history']}
+    
+    if data.get('date_range'):
+        start_date = datetime.datetime.fromisoformat(data['date_range']['start'])
+        end_date = datetime.datetime.fromisoformat(data['date_range']['end'])
+        query['createdAt'] = {'$gte': start_date, '$lte': end_date}
+
+    return query
+
+def age_bucket_label(lower):
+    """Label an $bucket lower bound as e.g. '18-29'"""
+    if lower not in AGE_BUCKETS:
+        return 'unknown'
+    upper = AGE_BUCKETS[AGE_BUCKETS.index(lower) + 1] - 1
+    return f"{lower}+" if upper >= AGE_BUCKETS[-1] - 1 else f"{lower}-{upper}"
+
 @app.route('/api/search/advanced', methods=['POST'])
 @token_required
 def advanced_search():
     try:
-        data = request.json
-        query = {}
-        
-        # Build complex search query
-        if data.get('name'):
-            query['$or'] = [
-                {'firstName': {'$regex': data['name'], '$options': 'i'}},
-                {'lastName': {'$regex': data['name'], '$options': 'i'}}
+        data = request.json or {}
+        query = build_advanced_search_query(data)
+
+        page = max(1, int(data.get('page', 1)))
+        limit = max(1, min(int(data.get('limit', MAX_PAGE_SIZE)), MAX_PAGE_SIZE))
+        facet_limit = max(1, min(int(data.get('facet_limit', 10)), 50))
+
+        # One round trip: the page of hits, the true total and every facet count
+        pipeline = [
+            {"$match": query},
+            {"$facet": {
+                "patients": [
+                    {"$sort": {"createdAt": -1, "_id": -1}},
+                    {"$skip": (page - 1) * limit},
+                    {"$limit": limit},
+                    {"$project": PATIENT_PROJECTION}
+                ],
+                "total": [{"$count": "count"}],
+                "gender": [
+                    {"$group": {"_id": "$gender", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}}
+                ],
+                "status": [
+                    {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}}
+                ],
+                "ageBuckets": [
+                    {"$bucket": {
+                        "groupBy": "$age",
+                        "boundaries": AGE_BUCKETS,
+                        "default": "unknown",
+                        "output": {"count": {"$sum": 1}}
+                    }}
+                ],
+                "medicalHistory": [
+                    {"$unwind": "$medicalHistory"},
+                    {"$group": {"_id": "$medicalHistory", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1, "_id": 1}},
+                    {"$limit": facet_limit}
+                ]
+            }}
+        ]
+        result = next(patients_collection.aggregate(pipeline), {})
+
+        total = result['total'][0]['count'] if result.get('total') else 0
+        facets = {
+            "gender": [{"value": f['_id'], "count": f['count']} for f in result.get('gender', [])],
+            "status": [{"value": f['_id'], "count": f['count']} for f in result.get('status', [])],
+            "ageBuckets": [
+                {"value": age_bucket_label(f['_id']), "count": f['count']}
+                for f in result.get('ageBuckets', [])
+            ],
+            "medicalHistory": [
+                {"value": f['_id'], "count": f['count']} for f in result.get('medicalHistory', [])
             ]
-        
-        if data.get('email'):
-            query['email'] = {'$regex': data['email'], '$options': 'i'}
-        
-        if data.get('phone'):
-            query['phone'] = {'$regex': data['phone'], '$options': 'i'}
-        
-        if data.get('status'):
-            query['status'] = data['status']
-        
-        if data.get('gender'):
-            query['gender'] = data['gender']
-        
-        if data.get('age_range'):
-            min_age = data['age_range'].get('min', 0)
-            max_age = data['age_range'].get('max', 120)
-            query['age'] = {'$gte': min_age, '$lte': max_age}
-        
-        if data.get('medical_history'):
-            query['medicalHistory'] = {'$in': data['medical_history']}
-        
-        if data.get('date_range'):
-            start_date = datetime.datetime.fromisoformat(data['date_range']['start'])
-            end_date = datetime.datetime.fromisoformat(data['date_range']['end'])
-            query['createdAt'] = {'$gte': start_date, '$lte': end_date}
-        
-        # Execute search
-        patients = list(patients_collection.find(query).limit(100))
-        
-        for patient in patients:
-            patient['_id'] = str(patient['_id'])
-            if 'createdAt' in patient:
-                patient['createdAt'] = patient['createdAt'].isoformat()
+        }
         
         return jsonify({
-            "patients": patients,
-            "total": len(patients),
+            "patients": result.get('patients', []),
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "totalPages": (total + limit - 1) // limit,
+            "facets": facets,
             "query": data
         })
     except Exception as e:
@@ -790,26 +1726,18 @@ def advanced_search():
 @app.route('/api/analytics/revenue', methods=['GET'])
 @token_required
 @role_required('admin') # Assuming admin role for revenue analytics
+@analytics_cached('revenue', ttl=300, tags=('patients',))
 def get_revenue_analytics():
+    """Monthly revenue; from/to are optional YYYY-MM bounds (inclusive)"""
     try:
-        # Mock revenue data - in real system, this would come from billing system
-        pipeline = [
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": "%Y-%m",
-                            "date": "$createdAt"
-                        }
-                    },
-                    "revenue": {"$sum": 100},  # Mock $100 per patient
-                    "patient_count": {"$sum": 1}
-                }
-            },
-            {"$sort": {"_id": 1}}
-        ]
-        
-        result = list(patients_collection.aggregate(pipeline))
+        try:
+            from_month = parse_month(request.args['from']) if request.args.get('from') else None
+            to_month = parse_month(request.args['to']) if request.args.get('to') else None
+        except ValueError:
+            return jsonify({"error": "from/to must be YYYY-MM months"}), 400
+
+        # Stored closed months plus a live aggregate over the open month only
+        result = revenue_rollups.monthly(from_month, to_month)
         return jsonify({"revenue_data": result})
     except Exception as e:
         logger.error(f"Revenue analytics error: {e}")
@@ -818,32 +1746,72 @@ def get_revenue_analytics():
 @app.route('/api/analytics/doctor-performance', methods=['GET'])
 @token_required
 @role_required('admin') # Assuming admin role for doctor performance
+@analytics_cached('doctor_performance', ttl=120, tags=('patients', 'appointments', 'users'))
 def get_doctor_performance():
+    """Per-doctor patient/appointment counts for one page of doctors.
+
+    from/to (ISO dates) limit patients by createdAt and appointments by startAt.
+    """
     try:
-        # Mock doctor performance data
-        doctors = list(users_collection.find({"role": "doctor"}))
-        
+        page = max(1, int(request.args.get('page', 1)))
+        limit = max(1, min(int(request.args.get('limit', 50)), MAX_PAGE_SIZE))
+        try:
+            created_range = {}
+            if request.args.get('from'):
+                created_range['$gte'] = parse_calendar_bound(request.args['from'])
+            if request.args.get('to'):
+                created_range['$lt'] = parse_calendar_bound(request.args['to'], end=True)
+        except ValueError:
+            return jsonify({"error": "from/to must be ISO 8601 dates or datetimes"}), 400
+
+        doctor_filter = {"role": "doctor"}
+        total = users_collection.count_documents(doctor_filter)
+        doctors = list(
+            users_collection.find(doctor_filter, {"name": 1})
+            .sort([("name", 1), ("_id", 1)])
+            .skip((page - 1) * limit)
+            .limit(limit)
+        )
+        doctor_ids = [str(doctor['_id']) for doctor in doctors]
+
+        # Two grouped aggregations for the whole page instead of two counts per doctor
+        patient_match = {"assigned_doctor": {"$in": doctor_ids}}
+        appointment_match = {"doctor_id": {"$in": doctor_ids}}
+        if created_range:
+            patient_match['createdAt'] = created_range
+            appointment_match[START_AT_FIELD] = created_range
+        patient_counts = {
+            group['_id']: group['n'] for group in patients_collection.aggregate([
+                {"$match": patient_match},
+                {"$group": {"_id": "$assigned_doctor", "n": {"$sum": 1}}}
+            ])
+        }
+        appointment_counts = {
+            group['_id']: group['n'] for group in appointments_collection.aggregate([
+                {"$match": appointment_match},
+                {"$group": {"_id": "$doctor_id", "n": {"$sum": 1}}}
+            ])
+        }
+
         performance_data = []
-        for doctor in doctors:
-            # Count patients assigned to doctor
-            patient_count = patients_collection.count_documents({
-                "assigned_doctor": str(doctor['_id'])
-            })
-            
-            # Count appointments
-            appointment_count = db['appointments'].count_documents({
-                "doctor_id": str(doctor['_id'])
-            })
-            
+        for doctor, doctor_id in zip(doctors, doctor_ids):
+            patient_count = patient_counts.get(doctor_id, 0)
+            appointment_count = appointment_counts.get(doctor_id, 0)
             performance_data.append({
-                "doctor_id": str(doctor['_id']),
-                "doctor_name": doctor['name'],
+                "doctor_id": doctor_id,
+                "doctor_name": doctor.get('name'),
                 "patient_count": patient_count,
                 "appointment_count": appointment_count,
                 "efficiency_score": min(100, (patient_count + appointment_count) * 2)
             })
         
-        return jsonify({"doctor_performance": performance_data})
+        return jsonify({
+            "doctor_performance": performance_data,
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "totalPages": (total + limit - 1) // limit
+        })
     except Exception as e:
         logger.error(f"Doctor performance error: {e}")
         return jsonify({"error": "Failed to fetch doctor performance"}), 500
@@ -866,6 +1834,66 @@ def get_patient_satisfaction():
         logger.error(f"Patient satisfaction error: {e}")
         return jsonify({"error": "Failed to fetch satisfaction data"}), 500
 
+def parse_age_buckets(value):
+    """Custom ageBuckets boundaries: increasing whole numbers; raises ValueError"""
+    if value is None:
+        return AGE_BUCKETS
+    if not isinstance(value, list) or len(value) < 2 or len(value) > 50:
+        raise ValueError
+    boundaries = [int(b) for b in value]
+    if any(b < 0 for b in boundaries) or boundaries != sorted(set(boundaries)):
+        raise ValueError
+    return boundaries
+
+@app.route('/api/analytics/cohort', methods=['POST'])
+@token_required
+@admin_required
+def cohort_analytics():
+    """Counts and group-bys over the in-memory patient snapshot.
+
+    Body: {"filters": {<advanced search filters except name/email/phone>},
+    "groupBy": [...], "interval": "day|month|year", "ageBuckets": [...]}
+    """
+    try:
+        data = request.json or {}
+        filters = data.get('filters') or {}
+        group_by = data.get('groupBy', list(GROUP_BY_OPTIONS))
+        if isinstance(group_by, str):
+            group_by = [g.strip() for g in group_by.split(',') if g.strip()]
+        if not isinstance(filters, dict) or not isinstance(group_by, list):
+            return jsonify({"error": "filters must be an object and groupBy a list"}), 400
+        try:
+            age_boundaries = parse_age_buckets(data.get('ageBuckets'))
+        except (TypeError, ValueError):
+            return jsonify({"error": "ageBuckets must be 2-50 increasing whole numbers"}), 400
+
+        result = cohort_engine.query(
+            filters, group_by, age_boundaries=age_boundaries, interval=data.get('interval', 'month')
+        )
+        return jsonify(result)
+    except InvalidCohortQuery as e:
+        return jsonify({"error": str(e)}), 400
+    except CohortUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Cohort analytics error: {e}")
+        return jsonify({"error": "Failed to compute cohort"}), 500
+
+@app.route('/api/analytics/cohort/snapshot', methods=['GET', 'POST'])
+@token_required
+@admin_required
+def cohort_snapshot():
+    """Snapshot stats; POST rebuilds the snapshot from scratch"""
+    try:
+        if request.method == 'POST':
+            cohort_engine.refresh(full=True)
+        return jsonify(cohort_engine.stats())
+    except CohortUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Cohort snapshot error: {e}")
+        return jsonify({"error": "Failed to refresh cohort snapshot"}), 500
+
 # ------------------------
 # System Management Routes
 # ------------------------
@@ -875,40 +1903,85 @@ def get_patient_satisfaction():
 @role_required('admin') # Assuming admin role for user management
 def get_all_users():
     try:
-        users = list(users_collection.find({}, {'password': 0}))
-        
-        for user in users:
-            user['_id'] = str(user['_id'])
-            user['createdAt'] = user['createdAt'].isoformat()
-            if user.get('lastLogin'):
-                user['lastLogin'] = user['lastLogin'].isoformat()
+        try:
+            projection = parse_fields(request.args.get('fields'), 'users') or {'password': 0}
+        except InvalidFields as e:
+            return jsonify({"error": str(e)}), 400
+
+        users = list(users_collection.find({}, projection))
         
         return jsonify({"users": users})
     except Exception as e:
         logger.error(f"Get users error: {e}")
         return jsonify({"error": "Failed to fetch users"}), 500
 
+@app.route('/api/admin/metrics', methods=['GET'])
+@token_required
+@role_required('admin')
+def get_metrics():
+    """In-process cache and pipeline metrics for this worker"""
+    return jsonify({
+        "pid": os.getpid(),
+        "token_cache": token_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "analytics_cache": analytics_cache.stats(),
+        "availability_cache": availability_cache.stats(),
+        "password_hashing": hashing_executor.stats(),
+        "audit_writer": audit_writer.stats(),
+        "stats_counters": stats_counters.stats(),
+        "cohort_engine": cohort_engine.stats()
+    })
+
+def build_audit_log_filter(args):
+    """Build the audit log filter from action/user query args and a [from, to) range (ISO dates)"""
+    filter_query = {}
+    if args.get('action'):
+        filter_query['action'] = args['action']
+    if args.get('user'):
+        filter_query['user_id'] = args['user']
+    if args.get('from') or args.get('to'):
+        filter_query['timestamp'] = {}
+        if args.get('from'):
+            filter_query['timestamp']['$gte'] = parse_calendar_bound(args['from'])
+        if args.get('to'):
+            # A bare date includes that whole day
+            filter_query['timestamp']['$lt'] = parse_calendar_bound(args['to'], end=True)
+    return filter_query
+
 @app.route('/api/admin/audit-logs', methods=['GET'])
 @token_required
 @role_required('admin') # Assuming admin role for audit logs
 def get_audit_logs():
     try:
-        page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 50))
-        action_filter = request.args.get('action', '')
-        
+
+        try:
+            filter_query = build_audit_log_filter(request.args)
+        except ValueError:
+            return jsonify({"error": "from/to must be ISO 8601 dates"}), 400
+
+        # Keyset mode: pass cursor (empty for the first page); no count, no skip
+        if 'cursor' in request.args:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+            try:
+                logs, next_cursor = fetch_keyset_page(
+                    audit_logs_collection, filter_query, 'timestamp', -1, limit,
+                    cursor=request.args.get('cursor')
+                )
+            except InvalidCursor as e:
+                return jsonify({"error": str(e)}), 400
+            return jsonify({
+                "logs": logs,
+                "limit": limit,
+                "nextCursor": next_cursor,
+                "hasMore": next_cursor is not None
+            })
+
+        page = int(request.args.get('page', 1))
         skip = (page - 1) * limit
         
-        filter_query = {}
-        if action_filter:
-            filter_query['action'] = action_filter
-        
-        total = db['audit_logs'].count_documents(filter_query)
-        logs = list(db['audit_logs'].find(filter_query).sort('timestamp', -1).skip(skip).limit(limit))
-        
-        for log in logs:
-            log['_id'] = str(log['_id'])
-            log['timestamp'] = log['timestamp'].isoformat()
+        total = audit_logs_collection.count_documents(filter_query)
+        logs = list(audit_logs_collection.find(filter_query).sort([('timestamp', -1), ('_id', -1)]).skip(skip).limit(limit))
         
         return jsonify({
             "logs": logs,
@@ -921,28 +1994,51 @@ def get_audit_logs():
         logger.error(f"Get audit logs error: {e}")
         return jsonify({"error": "Failed to fetch audit logs"}), 500
 
+@app.route('/api/admin/audit-logs/export', methods=['GET'])
+@token_required
+@role_required('admin')
+def export_audit_logs():
+    try:
+        try:
+            filter_query = build_audit_log_filter(request.args)
+        except ValueError:
+            return jsonify({"error": "from/to must be ISO 8601 dates"}), 400
+
+        cursor = audit_logs_collection.find(filter_query).sort([('timestamp', -1), ('_id', -1)])
+        response = streaming_export(cursor, 'audit_logs', AUDIT_LOG_EXPORT_COLUMNS, default_format='ndjson')
+        if isinstance(response, Response):
+            # Compliance pulls are themselves audited, synchronously
+            log_audit('audit_logs_exported', request.user['user_id'], {
+                'filters': {k: request.args.get(k) for k in ('action', 'user', 'from', 'to') if request.args.get(k)}
+            }, durable=True)
+        return response
+    except Exception as e:
+        logger.error(f"Audit log export error: {e}")
+        return jsonify({"error": "Failed to export audit logs"}), 500
+
 @app.route('/api/admin/system-stats', methods=['GET'])
 @token_required
 @role_required('admin') # Assuming admin role for system stats
+@analytics_cached('system_stats', ttl=30)
 def get_system_stats():
     try:
         # Database stats
         db_stats = db.command("dbStats")
+        try:
+            server_status = db.command("serverStatus")
+        except OperationFailure as e:
+            logger.warning(f"serverStatus unavailable: {e}")
+            server_status = {}
         
-        # Collection stats
+        # Collection stats from storage metadata, not a scan of every document
         collections = ['patients', 'users', 'appointments', 'medical_records', 'audit_logs']
         collection_stats = {}
         
         for collection in collections:
             try:
-                stats = db[collection].aggregate([
-                    {"$group": {"_id": None, "count": {"$sum": 1}, "avg_size": {"$avg": {"$bsonSize": "$$ROOT"}}}}
-                ]).next()
-                collection_stats[collection] = {
-                    "count": stats['count'],
-                    "avg_size_bytes": stats['avg_size']
-                }
-            except:
+                collection_stats[collection] = collection_storage_stats(db[collection])
+            except Exception as e:
+                logger.error(f"collStats failed for {collection}: {e}")
                 collection_stats[collection] = {"count": 0, "avg_size_bytes": 0}
         
         # System info
@@ -951,9 +2047,10 @@ def get_system_stats():
             "storage_size_mb": round(db_stats['storageSize'] / (1024 * 1024), 2),
             "index_size_mb": round(db_stats['indexSize'] / (1024 * 1024), 2),
             "collections": collection_stats,
-            "uptime_seconds": db_stats.get('uptime', 0),
-            "connections": db_stats.get('connections', {}),
-            "version": db_stats.get('version', 'Unknown')
+            "cache": server_cache_stats(server_status),
+            "uptime_seconds": server_status.get('uptime', db_stats.get('uptime', 0)),
+            "connections": server_status.get('connections', db_stats.get('connections', {})),
+            "version": server_status.get('version', db_stats.get('version', 'Unknown'))
         }
         
         return jsonify({"system_stats": system_info})
@@ -969,53 +2066,68 @@ def get_system_stats():
 @token_required
 @role_required('admin') # Assuming admin role for backup
 def create_backup():
+    """Start a background backup; poll GET /api/admin/backup/<job_id> for progress"""
     try:
-        # Create backup timestamp
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"healthcare_backup_{timestamp}"
-        
-        # In a real system, this would create an actual database backup
-        # For now, we'll create a JSON export
-        backup_data = {
-            "timestamp": timestamp,
-            "patients": list(patients_collection.find({})),
-            "users": list(users_collection.find({}, {'password': 0})),
-            "appointments": list(db['appointments'].find({})),
-            "medical_records": list(db['medical_records'].find({}))
-        }
-        
-        # Convert ObjectIds to strings for JSON serialization
-        for collection_name, documents in backup_data.items():
-            if collection_name != "timestamp":
-                for doc in documents:
-                    doc['_id'] = str(doc['_id'])
-                    if 'createdAt' in doc:
-                        doc['createdAt'] = doc['createdAt'].isoformat()
-                    if 'updatedAt' in doc:
-                        doc['updatedAt'] = doc['updatedAt'].isoformat()
-        
-        # Save backup to file
-        backup_file = f"backups/{backup_name}.json"
-        os.makedirs("backups", exist_ok=True)
-        
-        with open(backup_file, 'w') as f:
-            json.dump(backup_data, f, indent=2)
-        
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        compression = data.get('compression') or request.args.get('compression') or config.BACKUP_COMPRESSION
+        if isinstance(compression, str):
+            compression = compression.lower()
+        job = backup_jobs.start(
+            BACKUP_COLLECTIONS, request.user['user_id'],
+            compression=compression, level=config.BACKUP_COMPRESSION_LEVEL or None
+        )
+
         # Log audit
-        log_audit('backup_created', request.user['user_id'], {
-            'backup_name': backup_name,
-            'file_path': backup_file
+        log_audit('backup_started', request.user['user_id'], {
+            'backup_name': job['name'],
+            'job_id': job['_id'],
+            'compression': compression
         })
-        
+
         return jsonify({
-            "message": "Backup created successfully",
-            "backup_name": backup_name,
-            "file_path": backup_file
-        })
+            "message": "Backup started",
+            "job_id": job['_id'],
+            "backup_name": job['name'],
+            "status": job['status'],
+            "status_url": f"/api/admin/backup/{job['_id']}"
+        }), 202
+    except UnsupportedCompression as e:
+        return jsonify({"error": str(e)}), 400
+    except BackupInProgress as e:
+        return jsonify({"error": str(e)}), 409
+    except BackupsUnavailable as e:
+        logger.error(f"Backup refused: {e}")
+        return jsonify({"error": "Backups are unavailable"}), 503
     except Exception as e:
         logger.error(f"Backup creation error: {e}")
         return jsonify({"error": "Failed to create backup"}), 500
 
+@app.route('/api/admin/backup/<job_id>', methods=['GET'])
+@token_required
+@role_required('admin')
+def get_backup_status(job_id):
+    try:
+        job = backup_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Backup job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        logger.error(f"Backup status error: {e}")
+        return jsonify({"error": "Failed to fetch backup status"}), 500
+
+@app.route('/api/admin/backups', methods=['GET'])
+@token_required
+@role_required('admin')
+def list_backups():
+    """The 20 most recent backup jobs, newest first"""
+    try:
+        return jsonify({"backups": backup_jobs.recent()})
+    except Exception as e:
+        logger.error(f"List backups error: {e}")
+        return jsonify({"error": "Failed to fetch backups"}), 500
+
 @app.route('/api/admin/maintenance', methods=['POST'])
 @token_required
 @role_required('admin') # Assuming admin role for maintenance
@@ -1023,12 +2135,13 @@ def run_maintenance():
     try:
         maintenance_tasks = []
         
-        # Clean up old audit logs (older than 1 year)
-        one_year_ago = datetime.datetime.utcnow() - datetime.timedelta(days=365)
-        old_logs_result = db['audit_logs'].delete_many({
-            "timestamp": {"$lt": one_year_ago}
-        })
-        maintenance_tasks.append(f"Cleaned {old_logs_result.deleted_count} old audit logs")
+        # Old audit logs are expired by the TTL index; just make sure it matches the policy
+        try:
+            retention_days = ensure_audit_log_retention()
+            if retention_days:
+                maintenance_tasks.append(f"Audit log retention enforced by TTL index ({retention_days} days)")
+        except Exception as e:
+            logger.error(f"Audit log retention error: {e}")
         
         # Update database indexes
         try:
@@ -1036,6 +2149,43 @@ def run_maintenance():
             maintenance_tasks.append("Updated patient indexes")
         except:
             pass
+
+        # Index any patients written before search tokens existed
+        try:
+            indexed = backfill_search_tokens(patients_collection)
+            maintenance_tasks.append(f"Built search tokens for {indexed} patients")
+        except Exception as e:
+            logger.error(f"Search token backfill error: {e}")
+
+        # Rebuild dashboard counters from source
+        try:
+            corrected = stats_counters.reconcile()
+            maintenance_tasks.append(f"Reconciled dashboard counters ({corrected} corrected)")
+        except Exception as e:
+            logger.error(f"Stats counter reconcile error: {e}")
+
+        # Re-aggregate closed revenue months from source
+        try:
+            months = revenue_rollups.rebuild()
+            maintenance_tasks.append(f"Rebuilt revenue rollups ({months} months)")
+        except Exception as e:
+            logger.error(f"Revenue rollup rebuild error: {e}")
+
+        # One spelling per slot date and time, then make sure the unique slot index exists
+        try:
+            normalized, conflicts = normalize_appointment_times(appointments_collection)
+            maintenance_tasks.append(f"Normalized dates/times on {normalized} appointments ({conflicts} conflicting bookings)")
+            if ensure_appointment_slot_index():
+                maintenance_tasks.append("Unique appointment slot index in place")
+        except Exception as e:
+            logger.error(f"Appointment date/time normalization error: {e}")
+
+        # Give appointments booked before startAt existed a start time
+        try:
+            migrated = backfill_start_at(appointments_collection)
+            maintenance_tasks.append(f"Set startAt on {migrated} appointments")
+        except Exception as e:
+            logger.error(f"Appointment startAt backfill error: {e}")
         
         # Optimize collections
         try:
@@ -1073,7 +2223,7 @@ def staff_login():
 
         user = users_collection.find_one({"email": email})
 
-        if user and bcrypt.checkpw(password.encode('utf-8'), user['password']):
+        if user and hashing_executor.check_password(password, user['password']):
             token = jwt.encode({
                 'user_id': str(user['_id']),
                 'email': user['email'],
@@ -1094,113 +2244,59 @@ def staff_login():
             })
 
         return jsonify({"message": "Invalid credentials"}), 401
+    except HashingBusy:
+        return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
     except Exception as e:
         logger.error(f"Staff login error: {e}")
         return jsonify({"error": "Login failed"}), 500
 
 @app.route('/api/staff/patients', methods=['GET'])
 @token_required
+@cached_response(PATIENT_LIST_TAG)
 def staff_get_patients():
-    page = int(request.args.get('page', 1))
-    limit = int(request.args.get('limit', 10))
-    search = request.args.get('search', '')
-    sort_by = request.args.get('sortBy', 'createdAt')
-    sort_order = request.args.get('sortOrder', 'desc')
-    
-    skip = (page - 1) * limit
-    sort_direction = -1 if sort_order == 'desc' else 1
-    
-    # Build search filter
-    search_filter = {}
-    if search:
-        search_filter = {
-            '$or': [
-                {'firstName': {'$regex': search, '$options': 'i'}},
-                {'lastName': {'$regex': search, '$options': 'i'}},
-                {'email': {'$regex': search, '$options': 'i'}},
-                {'phone': {'$regex': search, '$options': 'i'}}
-            ]
-        }
-    
-    # Get total count
-    total = patients_collection.count_documents(search_filter)
-    
-    # Get patients with pagination and sorting
-    patients = list(patients_collection.find(
-        search_filter,
-        {'password': 0}  # Exclude password field
-    ).sort(sort_by, sort_direction).skip(skip).limit(limit))
-    
-    # Convert ObjectId to string for JSON serialization
-    for patient in patients:
-        patient['_id'] = str(patient['_id'])
-        if 'createdAt' in patient:
-            patient['createdAt'] = patient['createdAt'].isoformat()
-        if 'updatedAt' in patient:
-            patient['updatedAt'] = patient['updatedAt'].isoformat()
-    
-    return jsonify({
-        "patients": patients,
-        "totalCount": total,
-        "page": page,
-        "limit": limit,
-        "totalPages": (total + limit - 1) // limit
-    })
+    return list_patients('totalCount')
 
 @app.route('/api/staff/patients/<patient_id>', methods=['GET'])
 @token_required
+@cached_response('patient:{patient_id}')
 def staff_get_patient(patient_id):
     try:
-        patient = patients_collection.find_one({"_id": ObjectId(patient_id)})
+        patient = patients_collection.find_one({"_id": ObjectId(patient_id)}, PATIENT_PROJECTION)
         if not patient:
             return jsonify({"message": "Patient not found"}), 404
         
-        patient['_id'] = str(patient['_id'])
-        if 'createdAt' in patient:
-            patient['createdAt'] = patient['createdAt'].isoformat()
-        if 'updatedAt' in patient:
-            patient['updatedAt'] = patient['updatedAt'].isoformat()
-        
-        return jsonify(patient)
+        response = jsonify(patient)
+        response.last_modified = latest_update([patient])
+        return response
     except Exception as e:
         return jsonify({"message": "Invalid patient ID"}), 400
 
+def dashboard_totals():
+    """Patient/staff/appointment totals from the counters, or from source before the first rebuild"""
+    counters = stats_counters.totals()
+    if counters is not None:
+        return totals_from_counters(counters)
+    stats_counters.request_reconcile()
+    return collection_totals(patients_collection, users_collection, appointments_collection)
+
 @app.route('/api/staff/analytics/dashboard/<role>', methods=['GET'])
 @token_required
+@analytics_cached('staff_dashboard', ttl=30, tags=('patients', 'appointments', 'users'), per_user=True)
 def staff_dashboard_analytics(role):
     try:
-        # Get real data from MongoDB
-        total_patients = patients_collection.count_documents({})
-        total_staff = users_collection.count_documents({"role": {"$ne": "patient"}})
-        total_appointments = appointments_collection.count_documents({})
-        
-        # Get role-specific stats
+        # One find_one on the counters; computed from source until they are first built
         if role == 'admin':
+            totals = dashboard_totals()
             stats = {
-                "totalPatients": total_patients,
-                "totalStaff": total_staff,
-                "totalAppointments": total_appointments,
-                "revenue": total_patients * 150  # Mock revenue calculation
+                **totals,
+                "revenue": totals['totalPatients'] * 150  # Mock revenue calculation
             }
         elif role == 'doctor':
-            # Get doctor-specific data
-            doctor_appointments = appointments_collection.count_documents({
-                "doctor_id": request.user['user_id']
-            })
-            stats = {
-                "todayAppointments": doctor_appointments,
-                "completedAppointments": appointments_collection.count_documents({
-                    "doctor_id": request.user['user_id'],
-                    "status": "completed"
-                }),
-                "pendingAppointments": appointments_collection.count_documents({
-                    "doctor_id": request.user['user_id'],
-                    "status": "pending"
-                }),
-                "totalPatients": patients_collection.count_documents({
-                    "assigned_doctor": request.user['user_id']
-                })
-            }
+            counters = stats_counters.doctor(request.user['user_id'])
+            if counters is not None:
+                stats = doctor_stats_from_counters(counters)
+            else:
+                stats = doctor_stats(appointments_collection, patients_collection, request.user['user_id'])
         elif role == 'nurse':
             stats = {
                 "patientsAssigned": 24,  # Mock data - would come from assignments
@@ -1209,9 +2305,10 @@ def staff_dashboard_analytics(role):
                 "vitalSignsRecorded": 45
             }
         elif role == 'receptionist':
+            totals = dashboard_totals()
             stats = {
-                "appointmentsScheduled": total_appointments,
-                "patientsRegistered": total_patients,
+                "appointmentsScheduled": totals['totalAppointments'],
+                "patientsRegistered": totals['totalPatients'],
                 "callsHandled": 23,  # Mock data
                 "pendingTasks": 3
             }
@@ -1224,9 +2321,7 @@ def staff_dashboard_analytics(role):
             }
         else:
             stats = {
-                "totalPatients": total_patients,
-                "totalStaff": total_staff,
-                "totalAppointments": total_appointments,
+                **dashboard_totals(),
                 "revenue": 0
             }
         
@@ -1241,34 +2336,22 @@ def staff_get_appointments():
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
-        date_filter = request.args.get('date', '')
-        doctor_filter = request.args.get('doctor', '')
-        status_filter = request.args.get('status', '')
         
         skip = (page - 1) * limit
         
         # Build filter
-        filter_query = {}
-        if date_filter:
-            filter_query['date'] = date_filter
-        if doctor_filter:
-            filter_query['doctor_id'] = doctor_filter
-        if status_filter:
-            filter_query['status'] = status_filter
+        filter_query = build_appointment_filter(request.args)
+
+        try:
+            projection = parse_fields(request.args.get('fields'), 'appointments')
+        except InvalidFields as e:
+            return jsonify({"error": str(e)}), 400
         
         # Get total count
         total = appointments_collection.count_documents(filter_query)
         
         # Get appointments with pagination
-        appointments = list(appointments_collection.find(filter_query).sort('date', 1).skip(skip).limit(limit))
-        
-        # Convert ObjectId to string for JSON serialization
-        for appointment in appointments:
-            appointment['_id'] = str(appointment['_id'])
-            if 'createdAt' in appointment:
-                appointment['createdAt'] = appointment['createdAt'].isoformat()
-            if 'updatedAt' in appointment:
-                appointment['updatedAt'] = appointment['updatedAt'].isoformat()
+        appointments = list(appointments_collection.find(filter_query, projection).sort([(START_AT_FIELD, 1), ('_id', 1)]).skip(skip).limit(limit))
         
         return jsonify({
             "appointments": appointments,
@@ -1304,23 +2387,20 @@ def admin_get_staff():
                 {'email': {'$regex': search, '$options': 'i'}}
             ]
         
+        try:
+            projection = parse_fields(request.args.get('fields'), 'users') or {'password': 0}
+        except InvalidFields as e:
+            return jsonify({"error": str(e)}), 400
+        
         # Get total count
         total = users_collection.count_documents(filter_query)
         
         # Get staff with pagination
         staff = list(users_collection.find(
             filter_query,
-            {'password': 0}  # Exclude password field
+            projection  # Never includes the password field
         ).sort('createdAt', -1).skip(skip).limit(limit))
         
-        # Convert ObjectId to string for JSON serialization
-        for user in staff:
-            user['_id'] = str(user['_id'])
-            if 'createdAt' in user:
-                user['createdAt'] = user['createdAt'].isoformat()
-            if 'lastLogin' in user and user['lastLogin']:
-                user['lastLogin'] = user['lastLogin'].isoformat()
-        
         return jsonify({
             "staff": staff,
             "total": total,
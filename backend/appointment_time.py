@@ -0,0 +1,131 @@
+"""Normalized appointment start times.
+
+Appointments store ``date`` as an ISO 'YYYY-MM-DD' string and ``time``
+normalized to ``TIME_FORMAT`` ('09:30 AM'), so the unique slot index sees
+'12/31/2099 9:30 am' and '2099-12-31 09:30' as the same slot. A ``startAt`` datetime derived
+from both lets schedules be sorted chronologically and range-queried on an
+index. ``startAt`` is naive and in clinic-local time, exactly as the strings
+describe it.
+"""
+import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+START_AT_FIELD = 'startAt'
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y')
+TIME_FORMATS = ('%I:%M %p', '%I:%M%p', '%H:%M', '%H:%M:%S')
+TIME_FORMAT = '%I:%M %p'
+
+# Unique index that makes booking a slot a single atomic insert
+APPOINTMENT_SLOT_INDEX = 'appointment_slot_unique'
+APPOINTMENT_SLOT_KEYS = [('date', 1), ('time', 1), ('doctor_id', 1)]
+
+
+def parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value[:10], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_time(value):
+    if not isinstance(value, str):
+        return None
+    value = value.strip().upper()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_date(value):
+    """ISO 'YYYY-MM-DD' form of a date, or None when it does not parse"""
+    parsed = parse_date(value)
+    return parsed.isoformat() if parsed is not None else None
+
+
+def normalize_time(value):
+    """Canonical 'HH:MM AM' form of a time string, or None when it does not parse"""
+    parsed = parse_time(value)
+    return parsed.strftime(TIME_FORMAT) if parsed is not None else None
+
+
+def start_at(date_value, time_value):
+    """startAt for a date/time pair; midnight when only the date parses, None without a date"""
+    day = parse_date(date_value)
+    if day is None:
+        return None
+    return datetime.datetime.combine(day, parse_time(time_value) or datetime.time())
+
+
+def touches_schedule(update):
+    return 'date' in update or 'time' in update
+
+
+def backfill_start_at(collection, batch_size=1000, only_missing=True):
+    """Derive startAt from date/time in batches; returns the number of documents updated"""
+    query = {START_AT_FIELD: {'$exists': False}} if only_missing else {}
+    updated = 0
+    batch = []
+    for document in collection.find(query, {'date': 1, 'time': 1}).batch_size(batch_size):
+        batch.append(UpdateOne(
+            {'_id': document['_id']},
+            {'$set': {START_AT_FIELD: start_at(document.get('date'), document.get('time'))}}
+        ))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+def normalize_appointment_times(collection, batch_size=1000):
+    """Rewrite stored dates and times in canonical form; returns (updated, conflicts).
+
+    A conflict is an appointment whose normalized slot collides with another
+    booking of the same slot under the unique index. It keeps its old date
+    and time and needs to be resolved by hand. Values that do not parse are
+    left as they are.
+    """
+    updated = conflicts = 0
+    batch = []
+
+    def flush():
+        nonlocal updated, conflicts
+        try:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+        except BulkWriteError as e:
+            updated += e.details.get('nModified', 0)
+            conflicts += sum(1 for error in e.details.get('writeErrors', []) if error.get('code') == 11000)
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+
+    for document in collection.find({}, {'date': 1, 'time': 1}).batch_size(batch_size):
+        changes = {}
+        for field, normalize in (('date', normalize_date), ('time', normalize_time)):
+            normalized = normalize(document.get(field))
+            if normalized is not None and normalized != document.get(field):
+                changes[field] = normalized
+        if not changes:
+            continue
+        batch.append(UpdateOne({'_id': document['_id']}, {'$set': changes}))
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return updated, conflicts
@@ -0,0 +1,160 @@
+"""Background, batched writer for audit log entries.
+
+Requests hand entries to a bounded in-process queue and return immediately;
+a daemon thread writes them with ``insert_many`` whenever a batch fills up or
+the flush interval passes, and drains the queue on shutdown. When the queue
+is full a request waits briefly (backpressure) and then drops the entry
+rather than stalling. Callers that need an entry on disk before responding
+pass ``durable=True`` to write it synchronously.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    """Bounded queue + flusher thread in front of the audit_logs collection"""
+
+    def __init__(self, collection, max_queue=10000, batch_size=500, flush_interval=1.0,
+                 enqueue_timeout=0.05, max_retries=3):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self.enqueued = 0
+        self.written = 0
+        self.durable_writes = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.batches = 0
+        self.flush_errors = 0
+        self.last_flush_ms = None
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so (re)start in each worker process
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def write(self, entry, durable=False):
+        """Queue an entry, or insert it now when durable is set"""
+        if durable or self._stopping.is_set():
+            self.collection.insert_one(entry)
+            with self._lock:
+                self.durable_writes += 1
+            return True
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.backpressure_waits += 1
+            try:
+                self._queue.put(entry, timeout=self.enqueue_timeout)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                logger.warning("Audit queue full, dropped entry for action %s", entry.get('action'))
+                return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._flush_batch(wait=True)
+        self.drain()
+
+    def _flush_batch(self, wait):
+        """Collect up to batch_size entries (waiting up to flush_interval) and write them"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if wait and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._insert(batch)
+        return len(batch)
+
+    def _insert(self, batch):
+        started = time.perf_counter()
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.collection.insert_many(batch, ordered=False)
+                with self._lock:
+                    self.written += len(batch)
+                    self.batches += 1
+                    self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+                return
+            except BulkWriteError as e:
+                # Keep what was written and retry only the entries that failed;
+                # duplicate keys mean an earlier attempt already stored them
+                failed = [err['index'] for err in e.details.get('writeErrors', []) if err.get('code') != 11000]
+                with self._lock:
+                    self.written += len(batch) - len(failed)
+                    self.flush_errors += 1
+                batch = [batch[i] for i in failed]
+                if not batch:
+                    return
+                logger.error(f"Audit flush partially failed (attempt {attempt}/{self.max_retries}): {e}")
+                time.sleep(min(0.1 * 2 ** attempt, 2))
+            except Exception as e:
+                with self._lock:
+                    self.flush_errors += 1
+                logger.error(f"Audit flush failed (attempt {attempt}/{self.max_retries}): {e}")
+                time.sleep(min(0.1 * 2 ** attempt, 2))
+        with self._lock:
+            self.dropped += len(batch)
+
+    def drain(self):
+        """Write everything still queued"""
+        while self._flush_batch(wait=False):
+            pass
+
+    def shutdown(self, timeout=5):
+        """Stop the flusher thread and drain the queue"""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.drain()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queueDepth": self._queue.qsize(),
+                "queueCapacity": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "durableWrites": self.durable_writes,
+                "dropped": self.dropped,
+                "backpressureWaits": self.backpressure_waits,
+                "batches": self.batches,
+                "flushErrors": self.flush_errors,
+                "lastFlushMs": self.last_flush_ms
+            }
@@ -0,0 +1,135 @@
+"""Free-slot lookup backed by cached per-day booking bitmaps.
+
+Each (date, doctor_id) pair is reduced to an int whose bit ``i`` is set when
+``SLOT_TIMES[i]`` is booked. Bitmaps missing from the cache are loaded for a
+whole date range in one aggregation, and booking writes invalidate only the
+days they touch. The cache is per worker process; the TTL bounds how stale
+another worker's bitmaps can get after a write.
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+# Bookable slots, matching the booking modal: 09:00 AM to 05:00 PM every 30 minutes
+SLOT_TIMES = [
+    (datetime.datetime(2000, 1, 1, 9) + datetime.timedelta(minutes=30 * i)).strftime('%I:%M %p')
+    for i in range(17)
+]
+ALL_SLOTS_MASK = (1 << len(SLOT_TIMES)) - 1
+MAX_RANGE_DAYS = 31
+
+_SLOT_INDEX = {
+    datetime.datetime.strptime(slot, '%I:%M %p').time(): i for i, slot in enumerate(SLOT_TIMES)
+}
+
+
+def slot_index(time_value):
+    """Index into SLOT_TIMES for a stored time ('09:30 AM' or '09:30'), or None"""
+    if not isinstance(time_value, str):
+        return None
+    for fmt in ('%I:%M %p', '%H:%M'):
+        try:
+            return _SLOT_INDEX.get(datetime.datetime.strptime(time_value.strip().upper(), fmt).time())
+        except ValueError:
+            continue
+    return None
+
+
+def date_range(start, end):
+    """ISO date strings from start to end inclusive"""
+    days = (end - start).days
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range(days + 1)]
+
+
+def free_slots(mask):
+    return [slot for i, slot in enumerate(SLOT_TIMES) if not mask & (1 << i)]
+
+
+def load_bitmaps(collection, dates, doctor_ids):
+    """Booked-slot bitmaps for every (date, doctor_id) pair, from one aggregation"""
+    pipeline = [
+        {'$match': {'date': {'$in': dates}, 'doctor_id': {'$in': doctor_ids}}},
+        {'$group': {'_id': {'date': '$date', 'doctor_id': '$doctor_id'}, 'times': {'$addToSet': '$time'}}}
+    ]
+    bitmaps = {(date, doctor_id): 0 for date in dates for doctor_id in doctor_ids}
+    for group in collection.aggregate(pipeline):
+        key = (group['_id']['date'], group['_id'].get('doctor_id'))
+        for time_value in group['times']:
+            index = slot_index(time_value)
+            if index is not None:
+                bitmaps[key] |= 1 << index
+    return bitmaps
+
+
+class AvailabilityCache:
+    """Thread-safe LRU of booked-slot bitmaps keyed by (date, doctor_id)"""
+
+    def __init__(self, max_entries=50000, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so in-flight loads never store stale bitmaps
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def bitmaps(self, collection, dates, doctor_ids):
+        """Return {(date, doctor_id): mask}, loading any missing pairs in one query"""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in ((date, doctor_id) for date in dates for doctor_id in doctor_ids):
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+            self.hits += len(found)
+            self.misses += len(dates) * len(doctor_ids) - len(found)
+            generation = self.generation
+
+        missing_dates = sorted({date for date in dates for doctor_id in doctor_ids if (date, doctor_id) not in found})
+        missing_doctors = sorted({doctor_id for date in dates for doctor_id in doctor_ids
+                                  if (date, doctor_id) not in found}, key=lambda d: (d is not None, d))
+        if missing_dates:
+            loaded = load_bitmaps(collection, missing_dates, missing_doctors)
+            with self._lock:
+                self.loads += 1
+                if generation == self.generation:
+                    expires_at = time.monotonic() + self.ttl_seconds
+                    for key, mask in loaded.items():
+                        self._entries[key] = (mask, expires_at)
+                        self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            for key, mask in loaded.items():
+                found.setdefault(key, mask)
+        return found
+
+    def invalidate(self, *appointments):
+        """Drop the bitmaps for the (date, doctor_id) of each appointment document"""
+        with self._lock:
+            self.generation += 1
+            for appointment in appointments:
+                if appointment:
+                    self._entries.pop((appointment.get('date'), appointment.get('doctor_id')), None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else None,
+                "loads": self.loads
+            }
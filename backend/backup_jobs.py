@@ -0,0 +1,243 @@
+"""Streaming, compressed database backups run as background jobs.
+
+A backup becomes one directory under ``BACKUP_DIR``. Inside it, each
+collection gets a compressed file with one document per line in canonical
+Extended JSON (``<collection>.json.gz`` or ``.json.zst``), plus a
+``manifest.json`` with per-collection counts, sizes and SHA-256 checksums.
+
+Canonical Extended JSON keeps ObjectId, dates, Decimal128 and the numeric
+types exactly, and a decompressed file can be loaded as-is with
+``mongoimport``. Documents are read in cursor batches and compressed as they
+are written, so memory stays at one batch whatever the database size.
+
+Job state lives in the ``backup_jobs`` collection, so any worker can report
+it. A unique partial index on ``active`` allows only one running backup at a
+time, and no backup starts until that index exists. Every update a job makes
+is conditional on it still holding the ``active`` slot: a job that was
+declared stale and superseded stops and removes its files instead of
+overwriting the record. Files are written to ``<name>.partial`` and renamed
+once complete.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from bson.json_util import CANONICAL_JSON_OPTIONS, dumps
+from pymongo.errors import DuplicateKeyError
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional codec
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIONS = ('gzip', 'zstd')
+ACTIVE_JOB_INDEX = 'backup_active_unique'
+QUEUED, RUNNING, COMPLETED, FAILED = 'queued', 'running', 'completed', 'failed'
+JOB_PROJECTION = {'active': 0}
+
+
+class BackupInProgress(Exception):
+    """Raised when another backup job is still running"""
+
+
+class BackupsUnavailable(Exception):
+    """Raised when the one-backup-at-a-time index cannot be created"""
+
+
+class UnsupportedCompression(ValueError):
+    pass
+
+
+class _Superseded(Exception):
+    """This job lost its active slot (declared stale) while running"""
+
+
+def available_compressions():
+    return tuple(c for c in COMPRESSIONS if c != 'zstd' or zstandard is not None)
+
+
+class _HashingWriter:
+    """File wrapper that counts and hashes the compressed bytes written through it"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.bytes += len(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+
+def _open_compressed(raw, compression, level):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=level or 6)
+    return zstandard.ZstdCompressor(level=level or 3).stream_writer(raw, closefd=False)
+
+
+def write_collection(collection, path, compression, query=None, projection=None, batch_size=1000,
+                     level=None, progress=None):
+    """Stream one collection to a compressed Extended JSON lines file; returns its manifest entry"""
+    extension = 'gz' if compression == 'gzip' else 'zst'
+    filename = f"{collection.name}.json.{extension}"
+    count = 0
+    with open(os.path.join(path, filename), 'wb') as raw:
+        hashing = _HashingWriter(raw)
+        with _open_compressed(hashing, compression, level) as out:
+            cursor = collection.find(query or {}, projection).sort('_id', 1).batch_size(batch_size)
+            batch = []
+            for document in cursor:
+                batch.append(dumps(document, json_options=CANONICAL_JSON_OPTIONS))
+                if len(batch) == batch_size:
+                    out.write(('\n'.join(batch) + '\n').encode('utf-8'))
+                    count += len(batch)
+                    batch = []
+                    if progress:
+                        progress(collection.name, count, hashing.bytes)
+            if batch:
+                out.write(('\n'.join(batch) + '\n').encode('utf-8'))
+                count += len(batch)
+    if progress:
+        progress(collection.name, count, hashing.bytes)
+    return {"file": filename, "documents": count, "bytes": hashing.bytes, "sha256": hashing.sha256.hexdigest()}
+
+
+class BackupJobs:
+    """Starts backups in a background thread and tracks them in a collection"""
+
+    def __init__(self, jobs, db, directory='backups', batch_size=1000, stale_seconds=900):
+        self.jobs = jobs
+        self.db = db
+        self.directory = directory
+        self.batch_size = batch_size
+        # A running job with no progress for this long is assumed dead (e.g. its worker exited)
+        self.stale_seconds = stale_seconds
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='backup')
+        self.indexes_ready = False
+
+    def ensure_indexes(self):
+        self.jobs.create_index(
+            'active', unique=True, name=ACTIVE_JOB_INDEX,
+            partialFilterExpression={'active': True}, background=True
+        )
+        self.jobs.create_index([('createdAt', -1)], background=True)
+        self.indexes_ready = True
+
+    def _fail_stale_jobs(self):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.stale_seconds)
+        self.jobs.update_many(
+            {'active': True, 'updatedAt': {'$lt': cutoff}},
+            {'$set': {'status': FAILED, 'error': 'Backup stopped reporting progress',
+                      'finishedAt': datetime.datetime.utcnow()},
+             '$unset': {'active': ''}}
+        )
+
+    def start(self, collections, user_id, compression='gzip', level=None):
+        """Queue a backup of {name: projection or None}; returns the job document"""
+        if not isinstance(compression, str) or compression not in available_compressions():
+            raise UnsupportedCompression(
+                f"compression must be one of: {', '.join(available_compressions())}"
+            )
+        now = datetime.datetime.utcnow()
+        job_id = uuid.uuid4().hex
+        job = {
+            '_id': job_id,
+            'name': f"healthcare_backup_{now.strftime('%Y%m%d_%H%M%S')}_{job_id[:6]}",
+            'status': QUEUED,
+            'active': True,
+            'compression': compression,
+            'collections': {name: {'documents': 0, 'bytes': 0} for name in collections},
+            'requestedBy': user_id,
+            'createdAt': now,
+            'updatedAt': now
+        }
+        if not self.indexes_ready:
+            try:
+                self.ensure_indexes()
+            except Exception as e:
+                raise BackupsUnavailable(f"Backup job index unavailable: {e}")
+        self._fail_stale_jobs()
+        try:
+            self.jobs.insert_one(job)
+        except DuplicateKeyError:
+            raise BackupInProgress("Another backup is already running")
+        self._pool.submit(self._run, job, collections, level)
+        job.pop('active')
+        return job
+
+    def _update(self, job_id, fields, finished=False):
+        """Update this job while it still holds the active slot; raises _Superseded otherwise"""
+        fields['updatedAt'] = datetime.datetime.utcnow()
+        update = {'$set': fields}
+        if finished:
+            fields['finishedAt'] = fields['updatedAt']
+            update['$unset'] = {'active': ''}
+        if not self.jobs.update_one({'_id': job_id, 'active': True}, update).matched_count:
+            raise _Superseded()
+
+    def _run(self, job, collections, level):
+        job_id = job['_id']
+        final_path = os.path.join(self.directory, job['name'])
+        partial_path = final_path + '.partial'
+        try:
+            os.makedirs(partial_path, exist_ok=True)
+            self._update(job_id, {'status': RUNNING, 'startedAt': datetime.datetime.utcnow()})
+
+            def progress(name, documents, written):
+                self._update(job_id, {f'collections.{name}': {'documents': documents, 'bytes': written}})
+
+            manifest = {
+                "name": job['name'],
+                "createdAt": job['createdAt'].isoformat(),
+                "format": "canonical Extended JSON, one document per line",
+                "compression": job['compression'],
+                "collections": {}
+            }
+            for name, projection in collections.items():
+                manifest["collections"][name] = write_collection(
+                    self.db[name], partial_path, job['compression'], projection=projection,
+                    batch_size=self.batch_size, level=level, progress=progress
+                )
+            with open(os.path.join(partial_path, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(partial_path, final_path)
+
+            try:
+                self._update(job_id, {
+                    'status': COMPLETED,
+                    'path': final_path,
+                    'collections': manifest["collections"],
+                    'totalBytes': sum(c['bytes'] for c in manifest["collections"].values())
+                }, finished=True)
+            except _Superseded:
+                shutil.rmtree(final_path, ignore_errors=True)
+                raise
+            logger.info(f"Backup {job['name']} written to {final_path}")
+        except _Superseded:
+            logger.warning(f"Backup {job['name']} was marked failed as stale while running; discarded its files")
+            shutil.rmtree(partial_path, ignore_errors=True)
+        except Exception as e:
+            logger.error(f"Backup {job['name']} failed: {e}")
+            shutil.rmtree(partial_path, ignore_errors=True)
+            try:
+                self._update(job_id, {'status': FAILED, 'error': str(e)}, finished=True)
+            except _Superseded:
+                pass
+
+    def get(self, job_id):
+        return self.jobs.find_one({'_id': job_id}, JOB_PROJECTION)
+
+    def recent(self, limit=20):
+        return list(self.jobs.find({}, JOB_PROJECTION).sort('createdAt', -1).limit(limit))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cohort queries on the columnar snapshot vs a Mongo $facet aggregation
+
+Builds a CohortEngine snapshot straight from synthetic patient documents
+(1M by default), then times filtered cohort queries with every group-by. With
+--mongo the same patients are loaded into a separate benchmark database and
+the equivalent $match/$facet aggregation is timed alongside.
+
+Usage (from backend/):
+    python -m benchmarks.bench_cohort [--count 1000000] [--repeat 5] [--mongo]
+"""
+
+import argparse
+import datetime
+import random
+import statistics
+import time
+from bson import ObjectId
+from pymongo import MongoClient
+import config
+from cohort_engine import CohortEngine
+
+GENDERS = ['male', 'female', 'other']
+STATUSES = ['active', 'inactive', 'discharged']
+CONDITIONS = ['Diabetes', 'Hypertension', 'Asthma', 'Arthritis', 'Migraine', 'Allergies', 'Obesity',
+              'Depression', 'Anxiety', 'COPD', 'Thyroid', 'Anemia', 'Eczema', 'Glaucoma', 'Gout']
+AGE_BUCKETS = [0, 18, 30, 45, 60, 75, 200]
+BATCH_SIZE = 10000
+
+QUERIES = {
+    'everyone': {},
+    'active diabetics': {'status': 'active', 'medical_history': ['Diabetes']},
+    'women 45-75, 2025': {'gender': 'female', 'age_range': {'min': 45, 'max': 75},
+                          'date_range': {'start': '2025-01-01T00:00:00', 'end': '2025-12-31T23:59:59'}},
+}
+
+
+def synthetic_patients(count, doctors, seed=42):
+    rng = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1)
+    for _ in range(count):
+        created = start + datetime.timedelta(seconds=rng.randrange(6 * 365 * 86400))
+        yield {
+            '_id': ObjectId(),
+            'gender': rng.choice(GENDERS),
+            'status': rng.choice(STATUSES),
+            'assigned_doctor': rng.choice(doctors),
+            'age': rng.randrange(0, 100),
+            'medicalHistory': rng.sample(CONDITIONS, rng.randrange(0, 4)),
+            'createdAt': created,
+            'updatedAt': created,
+        }
+
+
+def mongo_query(filters):
+    """The advanced search filter shape for the benchmark queries"""
+    query = {}
+    for field in ('status', 'gender'):
+        if filters.get(field):
+            query[field] = filters[field]
+    if filters.get('age_range'):
+        query['age'] = {'$gte': filters['age_range']['min'], '$lte': filters['age_range']['max']}
+    if filters.get('medical_history'):
+        query['medicalHistory'] = {'$in': filters['medical_history']}
+    if filters.get('date_range'):
+        query['createdAt'] = {'$gte': datetime.datetime.fromisoformat(filters['date_range']['start']),
+                              '$lte': datetime.datetime.fromisoformat(filters['date_range']['end'])}
+    return query
+
+
+def mongo_cohort(collection, filters):
+    return next(collection.aggregate([
+        {'$match': mongo_query(filters)},
+        {'$facet': {
+            'total': [{'$count': 'count'}],
+            'gender': [{'$group': {'_id': '$gender', 'count': {'$sum': 1}}}],
+            'status': [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}],
+            'doctor': [{'$group': {'_id': '$assigned_doctor', 'count': {'$sum': 1}}}],
+            'age': [{'$bucket': {'groupBy': '$age', 'boundaries': AGE_BUCKETS, 'default': 'unknown'}}],
+            'conditions': [{'$unwind': '$medicalHistory'},
+                           {'$group': {'_id': '$medicalHistory', 'count': {'$sum': 1}}}],
+            'registrations': [{'$group': {'_id': {'$dateToString': {'format': '%Y-%m', 'date': '$createdAt'}},
+                                          'count': {'$sum': 1}}}],
+        }}
+    ], allowDiskUse=True), {})
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--mongo', action='store_true', help='also time the $facet aggregation')
+    args = parser.parse_args()
+
+    doctors = [f"doctor{i}" for i in range(args.doctors)]
+    engine = CohortEngine(collection=None)
+    started = time.perf_counter()
+    engine._snapshot = engine.build(synthetic_patients(args.count, doctors))
+    engine._last_refresh = engine._last_full = time.monotonic()
+    engine.refresh_interval = engine.full_rebuild_interval = float('inf')
+    print(f"Built snapshot of {args.count:,} patients in {time.perf_counter() - started:.1f}s")
+
+    collection = None
+    if args.mongo:
+        client = MongoClient(config.MONGO_URI)
+        client.drop_database(f"{config.DB_NAME}_bench_cohort")
+        collection = client[f"{config.DB_NAME}_bench_cohort"]['patients']
+        batch = []
+        for patient in synthetic_patients(args.count, doctors):
+            batch.append(patient)
+            if len(batch) == BATCH_SIZE:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            collection.insert_many(batch, ordered=False)
+
+    print(f"{'query':>22}{'matched':>12}{'snapshot ms':>14}" + (f"{'mongo ms':>12}{'speedup':>10}" if collection is not None else ''))
+    for name, filters in QUERIES.items():
+        matched = engine.query(filters, age_boundaries=AGE_BUCKETS)['count']
+        snapshot_ms = median_ms(lambda: engine.query(filters, age_boundaries=AGE_BUCKETS), args.repeat)
+        line = f"{name:>22}{matched:>12,}{snapshot_ms:>14.1f}"
+        if collection is not None:
+            mongo_ms = median_ms(lambda: mongo_cohort(collection, filters), args.repeat)
+            line += f"{mongo_ms:>12.1f}{mongo_ms / max(snapshot_ms, 0.001):>9.1f}x"
+        print(line)
+
+    if collection is not None:
+        client.drop_database(f"{config.DB_NAME}_bench_cohort")
+
+
+if __name__ == '__main__':
+    main()
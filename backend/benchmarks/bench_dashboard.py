@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: doctor dashboard latency as appointments and patients grow
+
+For each collection size, times the old dashboard query shape (seven serial
+count_documents calls with no supporting indexes) against doctor_stats (one
+$match/$facet aggregation plus one count, on the (doctor_id, status) and
+assigned_doctor indexes). Data goes into a separate benchmark database.
+
+Usage (from backend/):
+    python -m benchmarks.bench_dashboard [--sizes 10000,100000,1000000] [--doctors 50] [--repeat 5]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from pymongo import MongoClient
+import config
+from dashboard_stats import APPOINTMENT_DASHBOARD_INDEX, PATIENT_DASHBOARD_INDEX, STAFF_FILTER, doctor_stats
+
+STATUSES = ['pending', 'confirmed', 'completed', 'cancelled']
+BATCH_SIZE = 10000
+
+
+def grow(collection, target, make):
+    """Append synthetic documents until the collection holds target of them"""
+    rng = random.Random(collection.estimated_document_count())
+    current = collection.estimated_document_count()
+    while current < target:
+        count = min(BATCH_SIZE, target - current)
+        collection.insert_many([make(rng) for _ in range(count)], ordered=False)
+        current += count
+
+
+def legacy_stats(db, doctor_id):
+    """The pre-aggregation dashboard: every total plus four per-doctor counts"""
+    db['patients'].count_documents({})
+    db['users'].count_documents(STAFF_FILTER)
+    db['appointments'].count_documents({})
+    db['appointments'].count_documents({'doctor_id': doctor_id})
+    db['appointments'].count_documents({'doctor_id': doctor_id, 'status': 'completed'})
+    db['appointments'].count_documents({'doctor_id': doctor_id, 'status': 'pending'})
+    db['patients'].count_documents({'assigned_doctor': doctor_id})
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    client = MongoClient(config.MONGO_URI)
+    client.drop_database(f"{config.DB_NAME}_bench_dashboard")
+    db = client[f"{config.DB_NAME}_bench_dashboard"]
+    doctors = [f"doctor{i}" for i in range(args.doctors)]
+    rng_doctor = random.Random(7)
+    db['users'].insert_many([{'name': d, 'role': 'doctor'} for d in doctors])
+
+    print(f"{'documents':>12}{'legacy ms':>12}{'aggregated ms':>16}{'speedup':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        grow(db['appointments'], size, lambda rng: {
+            'doctor_id': rng.choice(doctors), 'status': rng.choice(STATUSES), 'name': 'Bench'})
+        grow(db['patients'], size, lambda rng: {
+            'assigned_doctor': rng.choice(doctors), 'firstName': 'Bench'})
+
+        db['appointments'].drop_indexes()
+        db['patients'].drop_indexes()
+        legacy_ms = median_ms(lambda: legacy_stats(db, rng_doctor.choice(doctors)), args.repeat)
+
+        db['appointments'].create_index(APPOINTMENT_DASHBOARD_INDEX)
+        db['patients'].create_index(PATIENT_DASHBOARD_INDEX)
+        new_ms = median_ms(lambda: doctor_stats(db['appointments'], db['patients'], rng_doctor.choice(doctors)),
+                           args.repeat)
+        print(f"{size:>12,}{legacy_ms:>12.1f}{new_ms:>16.1f}{legacy_ms / max(new_ms, 0.001):>9.1f}x")
+
+    client.drop_database(f"{config.DB_NAME}_bench_dashboard")
+
+
+if __name__ == '__main__':
+    main()
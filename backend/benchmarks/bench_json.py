@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: serializing a 1,000-document patient list response
+
+Compares the old path (per-route str()/isoformat() loop + Flask's default
+stdlib provider) with MongoJSONProvider encoding BSON types directly.
+Needs no database.
+
+Usage (from backend/):
+    python -m benchmarks.bench_json [--docs 1000] [--repeat 200]
+"""
+
+import argparse
+import datetime
+import statistics
+import time
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+import json_provider
+from json_provider import MongoJSONProvider
+
+
+def make_documents(count):
+    now = datetime.datetime(2024, 1, 1, 9, 30)
+    return [{
+        '_id': ObjectId(),
+        'firstName': f'Patient{i}',
+        'lastName': 'Sharma',
+        'email': f'patient{i}@example.com',
+        'phone': '+919876543210',
+        'age': 20 + i % 60,
+        'gender': 'Female' if i % 2 else 'Male',
+        'status': 'active',
+        'medicalHistory': ['Diabetes', 'Hypertension'],
+        'assigned_doctor': str(ObjectId()),
+        'createdAt': now + datetime.timedelta(minutes=i),
+        'updatedAt': now + datetime.timedelta(minutes=i, seconds=30),
+    } for i in range(count)]
+
+
+def legacy_convert(documents):
+    """The loop routes used to run before jsonify"""
+    for doc in documents:
+        doc['_id'] = str(doc['_id'])
+        if 'createdAt' in doc:
+            doc['createdAt'] = doc['createdAt'].isoformat()
+        if 'updatedAt' in doc:
+            doc['updatedAt'] = doc['updatedAt'].isoformat()
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    documents = make_documents(args.docs)
+
+    legacy_app = Flask('legacy')
+    legacy_app.json = DefaultJSONProvider(legacy_app)
+    mongo_app = Flask('mongo')
+    mongo_app.json = MongoJSONProvider(mongo_app)
+
+    def legacy():
+        docs = [dict(d) for d in documents]
+        legacy_convert(docs)
+        with legacy_app.app_context():
+            legacy_app.json.response({'patients': docs, 'total': len(docs)}).get_data()
+
+    def provider():
+        docs = [dict(d) for d in documents]
+        with mongo_app.app_context():
+            mongo_app.json.response({'patients': docs, 'total': len(docs)}).get_data()
+
+    legacy_ms = measure(legacy, args.repeat)
+    provider_ms = measure(provider, args.repeat)
+
+    encoder = 'orjson' if json_provider.orjson is not None else 'stdlib json'
+    print(f"{args.docs} documents, median of {args.repeat} runs")
+    print(f"  legacy loop + default provider : {legacy_ms:8.2f} ms")
+    print(f"  MongoJSONProvider ({encoder:<11}): {provider_ms:8.2f} ms")
+    print(f"  speedup                        : {legacy_ms / provider_ms:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: unanchored $regex patient search vs the search token index
+
+Loads a synthetic patient dataset (1M documents by default) into a separate
+benchmark database and times the list endpoint's query shape (count + first
+page) for both search paths.
+
+Usage (from backend/):
+    python -m benchmarks.bench_search [--count 1000000] [--reuse] [--repeat 5]
+"""
+
+import argparse
+import random
+import statistics
+import time
+import datetime
+from pymongo import MongoClient
+import config
+from search_index import SEARCH_TOKENS_FIELD, build_search_tokens, search_filter
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+               'David', 'Elizabeth', 'Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha',
+               'Carlos', 'Sofia', 'Mateo', 'Lucia', 'Wei', 'Mei', 'Hiroshi', 'Yuki']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Sharma', 'Singh', 'Kumar', 'Patel', 'Gupta', 'Rodriguez', 'Martinez', 'Lopez',
+              'Chen', 'Wang', 'Tanaka', 'Sato', 'Kim', 'Lee', 'Nguyen', 'Tran']
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'clinic.org', 'mail.in']
+
+SEARCH_TERMS = ['john', 'sha', 'Priya Sharma', 'tanaka', 'outlook', '98765', 'zzz']
+
+BATCH_SIZE = 10000
+
+
+def synthetic_patient(i, rng):
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES)
+    patient = {
+        'firstName': first,
+        'lastName': last,
+        'email': f"{first.lower()}.{last.lower()}{i}@{rng.choice(DOMAINS)}",
+        'phone': f"+91{rng.randint(6000000000, 9999999999)}",
+        'age': rng.randint(0, 95),
+        'gender': rng.choice(['Male', 'Female', 'Other']),
+        'createdAt': datetime.datetime(2020, 1, 1) + datetime.timedelta(minutes=i),
+    }
+    patient[SEARCH_TOKENS_FIELD] = build_search_tokens(patient)
+    return patient
+
+
+def load_dataset(collection, count):
+    rng = random.Random(42)
+    collection.drop()
+    started = time.perf_counter()
+    for offset in range(0, count, BATCH_SIZE):
+        batch = [synthetic_patient(i, rng) for i in range(offset, min(offset + BATCH_SIZE, count))]
+        collection.insert_many(batch, ordered=False)
+    print(f"Loaded {count:,} patients in {time.perf_counter() - started:.1f}s")
+
+    # Same single-field indexes the app creates, plus the token index
+    for field in ('firstName', 'lastName', 'phone', 'email', 'createdAt'):
+        collection.create_index(field)
+    collection.create_index(SEARCH_TOKENS_FIELD)
+
+
+def regex_filter(term):
+    return {'$or': [
+        {'firstName': {'$regex': term, '$options': 'i'}},
+        {'lastName': {'$regex': term, '$options': 'i'}},
+        {'email': {'$regex': term, '$options': 'i'}},
+        {'phone': {'$regex': term, '$options': 'i'}}
+    ]}
+
+
+def time_query(collection, query, repeat):
+    """Median milliseconds for count_documents + first page of 10"""
+    samples = []
+    total = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        total = collection.count_documents(query)
+        list(collection.find(query, {SEARCH_TOKENS_FIELD: 0}).sort('createdAt', -1).limit(10))
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--reuse', action='store_true', help='reuse a previously loaded dataset')
+    args = parser.parse_args()
+
+    client = MongoClient(config.MONGO_URI)
+    collection = client[f"{config.DB_NAME}_bench"]['patients']
+    if not args.reuse or collection.estimated_document_count() == 0:
+        load_dataset(collection, args.count)
+
+    print(f"\n{'term':<16}{'regex ms':>12}{'hits':>10}{'tokens ms':>12}{'hits':>10}{'speedup':>10}")
+    for term in SEARCH_TERMS:
+        regex_ms, regex_hits = time_query(collection, regex_filter(term), args.repeat)
+        token_ms, token_hits = time_query(collection, search_filter(term), args.repeat)
+        print(f"{term:<16}{regex_ms:>12.1f}{regex_hits:>10}{token_ms:>12.1f}{token_hits:>10}"
+              f"{regex_ms / max(token_ms, 0.001):>9.0f}x")
+
+    # Hit counts differ by design: tokens match word prefixes, regex matches any substring
+    print("\nNote: token search matches word prefixes; regex matches substrings anywhere.")
+
+
+if __name__ == '__main__':
+    main()
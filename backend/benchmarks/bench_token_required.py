@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request cost of token_required with and without the JWT cache
+
+Runs an authenticated no-op view through Flask's test client, once with the
+old decode-every-request check and once through TokenCache, and also times the
+bare verification step. The cache is set up as the app ships it: backed by a
+revoked_tokens collection (in a separate benchmark database, seeded with
+--revoked entries) and syncing every TOKEN_REVOCATION_SYNC_SECONDS, so the
+timings include its periodic revocation queries.
+
+Usage (from backend/):
+    python -m benchmarks.bench_token_required [--requests 20000] [--revoked 1000] [--sync-seconds N]
+"""
+
+import argparse
+import datetime
+import time
+from functools import wraps
+import jwt
+from flask import Flask, jsonify, request
+from pymongo import MongoClient
+import config
+from token_cache import TokenCache, token_digest
+
+SECRET_KEY = 'benchmark-secret'
+
+
+def decode_token(token):
+    return jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+
+
+def make_app(verify):
+    """App with one protected route whose decorator mirrors token_required"""
+    app = Flask('bench')
+
+    def token_required(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            auth_header = request.headers.get('Authorization')
+            if not auth_header:
+                return jsonify({'error': 'Token missing'}), 401
+            try:
+                request.user = verify(auth_header.split()[1])
+            except jwt.InvalidTokenError:
+                return jsonify({'error': 'Invalid token'}), 401
+            return f(*args, **kwargs)
+        return decorated
+
+    @app.route('/ping')
+    @token_required
+    def ping():
+        return 'ok'
+
+    return app
+
+
+def time_calls(fn, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--revoked', type=int, default=1000, help='revoked tokens already on record')
+    parser.add_argument('--sync-seconds', type=float, default=config.TOKEN_REVOCATION_SYNC_SECONDS)
+    args = parser.parse_args()
+
+    client = MongoClient(config.MONGO_URI)
+    bench_db = f"{config.DB_NAME}_bench_tokens"
+    client.drop_database(bench_db)
+    revocations = client[bench_db]['revoked_tokens']
+    revocations.create_index("revokedAt")
+    now = datetime.datetime.utcnow()
+    if args.revoked:
+        revocations.insert_many([
+            {'_id': token_digest(f'revoked-{i}'), 'expiresAt': now + datetime.timedelta(hours=1), 'revokedAt': now}
+            for i in range(args.revoked)
+        ])
+
+    token = jwt.encode({
+        'user_id': '652f1c0e8f1b2a3c4d5e6f70',
+        'email': 'doctor@healthcare.com',
+        'name': 'Dr. Smith',
+        'role': 'doctor',
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
+    }, SECRET_KEY, algorithm='HS256')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    cache = TokenCache(revocations=revocations, revocation_sync_seconds=args.sync_seconds)
+    results = []
+    for label, verify in (('decode every request', decode_token),
+                          ('TokenCache', lambda t: cache.verify(t, decode_token))):
+        verify_us = time_calls(lambda: verify(token), args.requests)
+        test_client = make_app(verify).test_client()
+        request_us = time_calls(lambda: test_client.get('/ping', headers=headers), args.requests // 4)
+        results.append((label, verify_us, request_us))
+
+    print(f"{'':<24}{'verify us':>12}{'request us':>14}")
+    for label, verify_us, request_us in results:
+        print(f"{label:<24}{verify_us:>12.2f}{request_us:>14.1f}")
+    print(f"\nverification speedup: {results[0][1] / results[1][1]:.1f}x, cache {cache.stats()}")
+
+    client.drop_database(bench_db)
+
+
+if __name__ == '__main__':
+    main()
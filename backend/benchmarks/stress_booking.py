@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Stress test: concurrent public bookings must never double-book a slot
+
+Fires N simultaneous POST /api/appointments requests (200 by default) at a
+running API, spread over a handful of slots on a far-future date, releases
+them together with a barrier, then checks the database holds exactly one
+appointment per slot and that every other request got a 409. Test bookings
+are removed afterwards.
+
+Usage (from backend/, with the API running):
+    python -m benchmarks.stress_booking [--url http://localhost:5000] [--requests 200] [--slots 4]
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient
+import config
+
+SLOT_TIMES = ['09:00 AM', '09:30 AM', '10:00 AM', '10:30 AM', '11:00 AM', '11:30 AM',
+              '12:00 PM', '12:30 PM', '01:00 PM', '01:30 PM', '02:00 PM', '02:30 PM']
+STRESS_DATE = '2099-12-31'
+
+
+def book(url, barrier, i, slot_time):
+    body = json.dumps({
+        'name': f'Stress Test {i}',
+        'phone': f'+9190000{i:05d}',
+        'email': f'stress{i}@example.com',
+        'date': STRESS_DATE,
+        'time': slot_time
+    }).encode('utf-8')
+    req = urllib.request.Request(f"{url}/api/appointments", data=body,
+                                 headers={'Content-Type': 'application/json'}, method='POST')
+    barrier.wait()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return 'error'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--slots', type=int, default=4, choices=range(1, len(SLOT_TIMES) + 1),
+                        metavar=f'1-{len(SLOT_TIMES)}')
+    args = parser.parse_args()
+
+    appointments = MongoClient(config.MONGO_URI)[config.DB_NAME]['appointments']
+    appointments.delete_many({'date': STRESS_DATE})
+    slots = SLOT_TIMES[:args.slots]
+
+    barrier = threading.Barrier(args.requests)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.requests) as pool:
+        futures = [pool.submit(book, args.url, barrier, i, slots[i % len(slots)]) for i in range(args.requests)]
+        statuses = Counter(f.result() for f in futures)
+    elapsed = time.perf_counter() - started
+
+    per_slot = Counter(doc['time'] for doc in appointments.find({'date': STRESS_DATE}, {'time': 1}))
+    appointments.delete_many({'date': STRESS_DATE})
+
+    print(f"{args.requests} requests over {len(slots)} slots in {elapsed:.2f}s: {dict(statuses)}")
+    for slot_time in slots:
+        print(f"  {slot_time}: {per_slot.get(slot_time, 0)} booking(s)")
+
+    double_booked = [t for t in slots if per_slot.get(t, 0) > 1]
+    ok = (not double_booked
+          and statuses.get(201, 0) == sum(per_slot.values()) == len(slots)
+          and statuses.get(409, 0) == args.requests - len(slots))
+    print("PASS: no double booking" if ok else f"FAIL: double-booked {double_booked or 'none'}, statuses {dict(statuses)}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
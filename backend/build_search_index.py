@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Script to (re)build patient search tokens
+Run once after upgrading so patients created before the token index existed
+become searchable. Pass --all to rebuild every patient.
+"""
+
+import sys
+from pymongo import MongoClient
+import config
+from search_index import SEARCH_TOKENS_FIELD, backfill_search_tokens
+
+def build_search_index(rebuild_all=False):
+    """Backfill search tokens for the patients collection"""
+    
+    # Connect to MongoDB
+    try:
+        client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
+        client.admin.command('ping')
+        print("✅ Connected to MongoDB")
+    except Exception as e:
+        print(f"❌ Failed to connect to MongoDB: {e}")
+        return False
+    
+    patients_collection = client[config.DB_NAME]['patients']
+    patients_collection.create_index(SEARCH_TOKENS_FIELD, background=True)
+    
+    updated = backfill_search_tokens(patients_collection, only_missing=not rebuild_all)
+    print(f"🔎 Built search tokens for {updated} patients")
+    return True
+
+if __name__ == "__main__":
+    print("🏥 Healthcare System - Patient Search Index")
+    print("=" * 50)
+    
+    if not build_search_index(rebuild_all='--all' in sys.argv):
+        sys.exit(1)
@@ -0,0 +1,567 @@
+"""Columnar in-memory patient snapshot for cohort analytics.
+
+The fields population analytics needs are kept in NumPy arrays, one row per
+patient:
+
+- gender, status and assigned_doctor as int32 category codes
+- age as int16 (-1 when unknown)
+- createdAt as datetime64
+- medicalHistory as a uint64 bitmask over the most common conditions
+
+Filters become boolean masks, and group-bys become ``bincount``/``unique``
+calls over the masked columns, so a query over a million patients never
+touches Mongo.
+
+Snapshots are immutable and swapped whole. After the first full load, a
+refresh only fetches patients whose ``updatedAt`` moved past the previous
+watermark and patches copies of the arrays. Deletes cannot be seen that
+way, so ``remove`` also records a tombstone in a shared collection (expired
+by a TTL index) that every worker's refresh applies after the changed
+patients. A full rebuild runs periodically and re-applies any removals made
+while it was reading. NumPy is optional: without it the engine reports
+itself unavailable.
+"""
+import copy
+import datetime
+import logging
+import threading
+import time
+from collections import deque
+
+from bson import ObjectId
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_CONDITIONS = 64
+CATEGORICAL_FIELDS = ('gender', 'status', 'assigned_doctor')
+SNAPSHOT_PROJECTION = {
+    'gender': 1, 'status': 1, 'assigned_doctor': 1, 'age': 1, 'createdAt': 1, 'updatedAt': 1,
+    'medicalHistory': 1
+}
+GROUP_BY_OPTIONS = ('age', 'gender', 'status', 'assigned_doctor', 'conditions', 'registrations')
+# Tombstones are re-read from a little before the last read, so clock skew between workers cannot hide one
+TOMBSTONE_SKEW = datetime.timedelta(seconds=60)
+REGISTRATION_INTERVALS = {'day': 'D', 'month': 'M', 'year': 'Y'}
+UNSUPPORTED_FILTERS = ('name', 'email', 'phone')
+
+
+class CohortUnavailable(Exception):
+    """Raised when NumPy is not installed or no snapshot could be loaded"""
+
+
+class InvalidCohortQuery(ValueError):
+    pass
+
+
+def conditions_of(value):
+    """medicalHistory as a list of condition strings (lists or comma-separated text)"""
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, (list, tuple)):
+        return []
+    return [str(item).strip() for item in value if item is not None and str(item).strip()]
+
+
+def _age(value):
+    try:
+        age = int(value)
+    except (TypeError, ValueError):
+        return -1
+    return age if 0 <= age < 32767 else -1
+
+
+class Snapshot:
+    """One immutable set of columns"""
+
+    def __init__(self, ids, alive, age, created, codes, categories, condition_bits, conditions, watermark):
+        self.ids = ids
+        self.order = np.argsort(ids, kind='stable')
+        self.sorted_ids = ids[self.order]
+        self.alive = alive
+        self.age = age
+        self.created = created
+        self.codes = codes
+        self.categories = categories
+        self.condition_bits = condition_bits
+        self.conditions = conditions
+        self.watermark = watermark
+        # Tombstones written at or after this time are not applied yet
+        self.deleted_watermark = None
+        self.built_at = datetime.datetime.utcnow()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows_for(self, object_ids):
+        """Row index for each ObjectId (-1 when not in the snapshot)"""
+        keys = np.array([oid.binary for oid in object_ids], dtype='S12')
+        if not len(self.sorted_ids):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.sorted_ids, keys), len(self.sorted_ids) - 1)
+        return np.where(self.sorted_ids[positions] == keys, self.order[positions], -1)
+
+
+class _ColumnBuilder:
+    """Accumulates documents into column lists, coding values against existing dictionaries"""
+
+    def __init__(self, categories=None, conditions=None):
+        self.categories = {field: list((categories or {}).get(field, [])) for field in CATEGORICAL_FIELDS}
+        self._category_index = {field: {v: i for i, v in enumerate(values)} for field, values in self.categories.items()}
+        self.conditions = list(conditions or [])
+        self._condition_index = {c: i for i, c in enumerate(self.conditions)}
+        # Full builds code every condition and keep the most common ones at the end
+        self._open_conditions = conditions is None
+        self.ids = []
+        self.age = []
+        self.created = []
+        self.codes = {field: [] for field in CATEGORICAL_FIELDS}
+        self.condition_rows = []
+        self.condition_codes = []
+        self.watermark = None
+
+    def _code(self, field, value):
+        if value is None or value == '':
+            return -1
+        value = str(value)
+        index = self._category_index[field]
+        if value not in index:
+            index[value] = len(self.categories[field])
+            self.categories[field].append(value)
+        return index[value]
+
+    def add(self, document):
+        row = len(self.ids)
+        self.ids.append(document['_id'].binary)
+        self.age.append(_age(document.get('age')))
+        created = document.get('createdAt')
+        self.created.append(created if isinstance(created, datetime.datetime) else None)
+        for field in CATEGORICAL_FIELDS:
+            self.codes[field].append(self._code(field, document.get(field)))
+        for condition in set(conditions_of(document.get('medicalHistory'))):
+            code = self._condition_index.get(condition)
+            if code is None and (self._open_conditions or len(self.conditions) < MAX_TRACKED_CONDITIONS):
+                code = self._condition_index[condition] = len(self.conditions)
+                self.conditions.append(condition)
+            if code is not None:
+                self.condition_rows.append(row)
+                self.condition_codes.append(code)
+        updated = document.get('updatedAt') or created
+        if isinstance(updated, datetime.datetime) and (self.watermark is None or updated > self.watermark):
+            self.watermark = updated
+
+    def columns(self):
+        """Arrays for everything added so far"""
+        n = len(self.ids)
+        rows = np.array(self.condition_rows, dtype=np.int64)
+        codes = np.array(self.condition_codes, dtype=np.int64)
+        conditions = self.conditions
+        if self._open_conditions and len(conditions) > MAX_TRACKED_CONDITIONS:
+            # Keep the most common conditions and renumber them by frequency
+            frequency = np.bincount(codes, minlength=len(conditions))
+            keep = np.argsort(-frequency, kind='stable')[:MAX_TRACKED_CONDITIONS]
+            remap = np.full(len(conditions), -1, dtype=np.int64)
+            remap[keep] = np.arange(len(keep))
+            codes = remap[codes]
+            rows = rows[codes >= 0]
+            codes = codes[codes >= 0]
+            conditions = [conditions[i] for i in keep]
+        bits = np.zeros(n, dtype=np.uint64)
+        if len(codes):
+            np.bitwise_or.at(bits, rows, np.left_shift(np.uint64(1), codes.astype(np.uint64)))
+        return {
+            'ids': np.array(self.ids, dtype='S12'),
+            'age': np.array(self.age, dtype=np.int16),
+            'created': np.array(self.created, dtype='datetime64[s]'),
+            'codes': {field: np.array(values, dtype=np.int32) for field, values in self.codes.items()},
+            'condition_bits': bits,
+            'conditions': conditions,
+            'categories': self.categories,
+        }
+
+
+class CohortEngine:
+    """Owns the current snapshot and answers cohort queries against it"""
+
+    def __init__(self, collection, tombstones=None, refresh_interval=300, full_rebuild_interval=3600,
+                 batch_size=10000, load_timeout=60):
+        self.collection = collection
+        self.tombstones = tombstones
+        self.refresh_interval = refresh_interval
+        self.full_rebuild_interval = full_rebuild_interval
+        self.batch_size = batch_size
+        self.load_timeout = load_timeout
+        self._snapshot = None
+        self._lock = threading.Lock()
+        # Notified whenever a load finishes, successfully or not
+        self._loaded = threading.Condition(self._lock)
+        # (monotonic time, ObjectId) of local removals, re-applied to full builds that started earlier
+        self._recent_removals = deque(maxlen=100000)
+        self._refreshing = False
+        self._stale = False
+        self._last_refresh = 0.0
+        self._last_full = 0.0
+        self.full_builds = 0
+        self.incremental_refreshes = 0
+        self.refresh_errors = 0
+        self.last_build_ms = None
+        self.queries = 0
+        self.query_seconds_total = 0.0
+
+    @property
+    def available(self):
+        return np is not None
+
+    def build(self, documents):
+        """Full snapshot from an iterable of patient documents"""
+        builder = _ColumnBuilder()
+        for document in documents:
+            builder.add(document)
+        columns = builder.columns()
+        return Snapshot(
+            columns['ids'], np.ones(len(columns['ids']), dtype=bool), columns['age'], columns['created'],
+            columns['codes'], columns['categories'], columns['condition_bits'], columns['conditions'],
+            builder.watermark
+        )
+
+    def _apply_changes(self, snapshot, documents):
+        """New snapshot with changed/new documents patched into copies of the columns"""
+        builder = _ColumnBuilder(snapshot.categories, snapshot.conditions)
+        object_ids = []
+        for document in documents:
+            builder.add(document)
+            object_ids.append(document['_id'])
+        if not object_ids:
+            return snapshot
+        changes = builder.columns()
+        rows = snapshot.rows_for(object_ids)
+        existing = rows >= 0
+
+        def patch(column, values):
+            column = column.copy()
+            column[rows[existing]] = values[existing]
+            return np.concatenate([column, values[~existing]])
+
+        watermark = max(filter(None, [snapshot.watermark, builder.watermark]), default=None)
+        return Snapshot(
+            patch(snapshot.ids, changes['ids']),
+            patch(snapshot.alive, np.ones(len(rows), dtype=bool)),
+            patch(snapshot.age, changes['age']),
+            patch(snapshot.created, changes['created']),
+            {field: patch(snapshot.codes[field], changes['codes'][field]) for field in CATEGORICAL_FIELDS},
+            changes['categories'],
+            patch(snapshot.condition_bits, changes['condition_bits']),
+            changes['conditions'],
+            watermark
+        )
+
+    def tombstone_ttl_seconds(self):
+        """How long tombstones must survive: any refresh older than this is a full rebuild"""
+        return max(2 * self.full_rebuild_interval, 86400)
+
+    def ensure_indexes(self):
+        if self.tombstones is not None:
+            self.tombstones.create_index(
+                'deletedAt', expireAfterSeconds=self.tombstone_ttl_seconds(), background=True
+            )
+
+    def _deleted_since(self, since):
+        """Ids tombstoned at or after since (all recent ones when since is None)"""
+        if self.tombstones is None:
+            return []
+        query = {'deletedAt': {'$gte': since - TOMBSTONE_SKEW}} if since is not None else {}
+        return [t['_id'] for t in self.tombstones.find(query, {'_id': 1}).batch_size(self.batch_size)]
+
+    @staticmethod
+    def _without(snapshot, object_ids):
+        """Snapshot with these patients marked deleted (the same snapshot if none are present)"""
+        if not object_ids:
+            return snapshot
+        rows = snapshot.rows_for(object_ids)
+        rows = rows[rows >= 0]
+        if not len(rows) or not snapshot.alive[rows].any():
+            return snapshot
+        updated = copy.copy(snapshot)
+        updated.alive = snapshot.alive.copy()
+        updated.alive[rows] = False
+        return updated
+
+    def refresh(self, full=False):
+        """Rebuild (full) or catch up on patients updated and deleted since the watermarks"""
+        if np is None:
+            raise CohortUnavailable("Cohort analytics requires numpy")
+        started = time.perf_counter()
+        started_at = datetime.datetime.utcnow()
+        started_monotonic = time.monotonic()
+        current = self._snapshot
+        full = full or current is None or current.watermark is None
+        if full:
+            cursor = self.collection.find({}, SNAPSHOT_PROJECTION).batch_size(self.batch_size)
+            built = self.build(cursor)
+            # Patients deleted by any worker while the scan ran
+            deleted = self._deleted_since(started_at)
+        else:
+            changed = list(self.collection.find(
+                {'updatedAt': {'$gte': current.watermark}}, SNAPSHOT_PROJECTION
+            ).batch_size(self.batch_size))
+            deleted = self._deleted_since(current.deleted_watermark)
+
+        with self._lock:
+            if full:
+                # Local removals during the scan were applied to the old snapshot; carry them over
+                deleted += [oid for at, oid in self._recent_removals if at >= started_monotonic]
+                snapshot = copy.copy(self._without(built, deleted))
+                self.full_builds += 1
+                self._last_full = time.monotonic()
+            else:
+                # Patched onto whichever snapshot is current, so concurrent removals are kept
+                snapshot = copy.copy(self._without(self._apply_changes(self._snapshot, changed), deleted))
+                self.incremental_refreshes += 1
+            snapshot.deleted_watermark = started_at
+            self._snapshot = snapshot
+            self._last_refresh = time.monotonic()
+            self.last_build_ms = round((time.perf_counter() - started) * 1000, 2)
+            self._loaded.notify_all()
+        return snapshot
+
+    def _refresh_in_background(self):
+        try:
+            full = time.monotonic() - self._last_full >= self.full_rebuild_interval
+            self.refresh(full=full)
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            logger.error(f"Cohort snapshot refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._loaded.notify_all()
+
+    def _load(self):
+        """First load on this worker; other callers wait for it (up to load_timeout)"""
+        with self._lock:
+            loading = self._snapshot is None and not self._refreshing
+            if loading:
+                self._refreshing = True
+            else:
+                self._loaded.wait_for(
+                    lambda: self._snapshot is not None or not self._refreshing, timeout=self.load_timeout
+                )
+                if self._snapshot is None:
+                    raise CohortUnavailable("Cohort snapshot is not available yet")
+                return self._snapshot
+        try:
+            return self.refresh(full=True)
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            logger.error(f"Cohort snapshot load failed: {e}")
+            raise CohortUnavailable("Cohort snapshot could not be loaded") from e
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._loaded.notify_all()
+
+    def snapshot(self):
+        """Current snapshot; loads it on first use and refreshes stale ones in the background"""
+        if np is None:
+            raise CohortUnavailable("Cohort analytics requires numpy")
+        if self._snapshot is None:
+            return self._load()
+
+        with self._lock:
+            due = self._stale or time.monotonic() - self._last_refresh >= self.refresh_interval
+            start = due and not self._refreshing
+            if start:
+                self._refreshing = True
+                self._stale = False
+        if start:
+            threading.Thread(target=self._refresh_in_background, name='cohort-refresh', daemon=True).start()
+        return self._snapshot
+
+    def mark_stale(self):
+        """Patients changed; the next query kicks off an incremental refresh"""
+        self._stale = True
+
+    def remove(self, patient_id):
+        """Record a deleted patient for every worker and drop it from this worker's snapshot"""
+        object_id = ObjectId(patient_id)
+        if self.tombstones is not None:
+            try:
+                self.tombstones.replace_one(
+                    {'_id': object_id}, {'_id': object_id, 'deletedAt': datetime.datetime.utcnow()}, upsert=True
+                )
+            except Exception as e:
+                # Other workers keep counting the patient until their next full rebuild
+                logger.error(f"Cohort tombstone write failed for {patient_id}: {e}")
+        if np is None:
+            return
+        with self._lock:
+            self._recent_removals.append((time.monotonic(), object_id))
+            if self._snapshot is not None:
+                self._snapshot = self._without(self._snapshot, [object_id])
+
+    # Queries
+
+    def _category_mask(self, snapshot, field, values):
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        index = {v: i for i, v in enumerate(snapshot.categories[field])}
+        codes = [index[str(v)] for v in values if str(v) in index]
+        return np.isin(snapshot.codes[field], codes)
+
+    def mask(self, snapshot, filters):
+        """Boolean row mask for advanced-search style filters"""
+        unsupported = [key for key in UNSUPPORTED_FILTERS if filters.get(key)]
+        if unsupported:
+            raise InvalidCohortQuery(f"Text filters are not supported in cohorts: {', '.join(unsupported)}")
+        mask = snapshot.alive.copy()
+        for field in CATEGORICAL_FIELDS:
+            if filters.get(field):
+                mask &= self._category_mask(snapshot, field, filters[field])
+        if filters.get('age_range'):
+            try:
+                min_age = int(filters['age_range'].get('min', 0))
+                max_age = int(filters['age_range'].get('max', 120))
+            except (AttributeError, TypeError, ValueError):
+                raise InvalidCohortQuery("age_range needs whole-number min and max")
+            # Clamp to the int16 column so out-of-range bounds compare correctly
+            min_age, max_age = (min(max(age, -1), 32767) for age in (min_age, max_age))
+            mask &= (snapshot.age >= min_age) & (snapshot.age <= max_age)
+        if filters.get('medical_history'):
+            index = {c: i for i, c in enumerate(snapshot.conditions)}
+            requested = conditions_of(filters['medical_history'])
+            untracked = [c for c in requested if c not in index]
+            if untracked:
+                raise InvalidCohortQuery(f"Conditions not tracked in the snapshot: {', '.join(untracked)}")
+            wanted = np.uint64(sum(1 << index[c] for c in requested))
+            mask &= (snapshot.condition_bits & wanted) != 0
+        if filters.get('date_range'):
+            try:
+                start = np.datetime64(datetime.datetime.fromisoformat(filters['date_range']['start']), 's')
+                end_value = filters['date_range']['end']
+                end = np.datetime64(datetime.datetime.fromisoformat(end_value), 's')
+            except (KeyError, TypeError, ValueError):
+                raise InvalidCohortQuery("date_range needs ISO 8601 start and end")
+            if len(end_value) == 10:
+                # A bare YYYY-MM-DD end includes that whole day
+                mask &= (snapshot.created >= start) & (snapshot.created < end + np.timedelta64(1, 'D'))
+            else:
+                mask &= (snapshot.created >= start) & (snapshot.created <= end)
+        return mask
+
+    @staticmethod
+    def _value_counts(codes, labels):
+        counts = np.bincount(codes + 1, minlength=len(labels) + 1)
+        order = np.argsort(-counts, kind='stable')
+        return [
+            {"value": labels[i - 1] if i else None, "count": int(counts[i])}
+            for i in order if counts[i]
+        ]
+
+    @staticmethod
+    def _age_histogram(ages, boundaries):
+        known = ages[ages >= 0]
+        counts = np.histogram(known, bins=boundaries)[0]
+        result = []
+        for i, count in enumerate(counts):
+            lower, upper = boundaries[i], boundaries[i + 1] - 1
+            label = f"{lower}+" if i == len(counts) - 1 and upper >= 119 else f"{lower}-{upper}"
+            result.append({"value": label, "count": int(count)})
+        outside = len(ages) - int(counts.sum())
+        if outside:
+            result.append({"value": "unknown", "count": outside})
+        return result
+
+    @staticmethod
+    def _conditions(bits, conditions, top_pairs):
+        """Per-condition prevalence and pairwise co-occurrence, via distinct bitmask combinations"""
+        combos, counts = np.unique(bits[bits != 0], return_counts=True)
+        k = len(conditions)
+        if not len(combos) or not k:
+            return {"prevalence": [], "cooccurrence": []}
+        matrix = ((combos[:, None] >> np.arange(k, dtype=np.uint64)) & np.uint64(1)).astype(np.int64)
+        prevalence = counts @ matrix
+        together = (matrix * counts[:, None]).T @ matrix
+        upper_i, upper_j = np.triu_indices(k, 1)
+        pair_counts = together[upper_i, upper_j]
+        best = np.argsort(-pair_counts, kind='stable')[:top_pairs]
+        return {
+            "prevalence": [
+                {"value": conditions[i], "count": int(prevalence[i])}
+                for i in np.argsort(-prevalence, kind='stable') if prevalence[i]
+            ],
+            "cooccurrence": [
+                {"conditions": [conditions[upper_i[p]], conditions[upper_j[p]]], "count": int(pair_counts[p])}
+                for p in best if pair_counts[p]
+            ]
+        }
+
+    @staticmethod
+    def _registrations(created, interval):
+        known = created[~np.isnat(created)]
+        periods, counts = np.unique(known.astype(f'datetime64[{REGISTRATION_INTERVALS[interval]}]'), return_counts=True)
+        return [{"period": str(period), "count": int(count)} for period, count in zip(periods, counts)]
+
+    def query(self, filters=None, group_by=GROUP_BY_OPTIONS, age_boundaries=(0, 18, 30, 45, 60, 75, 200),
+              interval='month', top_pairs=20):
+        """Count and group-bys for the cohort matching filters"""
+        unknown = [g for g in group_by if g not in GROUP_BY_OPTIONS]
+        if unknown:
+            raise InvalidCohortQuery(f"groupBy must be drawn from: {', '.join(GROUP_BY_OPTIONS)}")
+        if interval not in REGISTRATION_INTERVALS:
+            raise InvalidCohortQuery(f"interval must be one of: {', '.join(REGISTRATION_INTERVALS)}")
+
+        snapshot = self.snapshot()
+        started = time.perf_counter()
+        mask = self.mask(snapshot, filters or {})
+        ages = snapshot.age[mask]
+        known_ages = ages[ages >= 0]
+        result = {
+            "count": int(mask.sum()),
+            "age": {
+                "mean": round(float(known_ages.mean()), 2) if len(known_ages) else None,
+                "median": float(np.median(known_ages)) if len(known_ages) else None
+            }
+        }
+        groups = {}
+        for group in group_by:
+            if group == 'age':
+                groups['age'] = self._age_histogram(ages, list(age_boundaries))
+            elif group in CATEGORICAL_FIELDS:
+                groups[group] = self._value_counts(snapshot.codes[group][mask], snapshot.categories[group])
+            elif group == 'conditions':
+                groups['conditions'] = self._conditions(snapshot.condition_bits[mask], snapshot.conditions, top_pairs)
+            elif group == 'registrations':
+                groups['registrations'] = self._registrations(snapshot.created[mask], interval)
+        result["groups"] = groups
+        result["snapshotBuiltAt"] = snapshot.built_at
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.queries += 1
+            self.query_seconds_total += elapsed
+        result["queryMs"] = round(elapsed * 1000, 2)
+        return result
+
+    def stats(self):
+        snapshot = self._snapshot
+        with self._lock:
+            return {
+                "available": np is not None,
+                "rows": len(snapshot) if snapshot is not None else 0,
+                "livePatients": int(snapshot.alive.sum()) if snapshot is not None else 0,
+                "trackedConditions": len(snapshot.conditions) if snapshot is not None else 0,
+                "builtAt": snapshot.built_at if snapshot is not None else None,
+                "watermark": snapshot.watermark if snapshot is not None else None,
+                "fullBuilds": self.full_builds,
+                "incrementalRefreshes": self.incremental_refreshes,
+                "refreshErrors": self.refresh_errors,
+                "lastBuildMs": self.last_build_ms,
+                "queries": self.queries,
+                "avgQueryMs": round(self.query_seconds_total / self.queries * 1000, 2) if self.queries else None
+            }
@@ -10,6 +10,9 @@ DB_NAME = os.getenv("DB_NAME", "healthcare_db")
 # JWT Configuration
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "04002966")
 JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", "3600"))  # 1 hour
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "300"))  # seconds, capped at the token's exp
+TOKEN_REVOCATION_SYNC_SECONDS = int(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", "5"))  # max delay before a logout reaches other workers
 
 # Flask Configuration
 FLASK_ENV = os.getenv("FLASK_ENV", "development")
@@ -17,6 +20,52 @@ DEBUG = os.getenv("DEBUG", "True").lower() == "true"
 
 # Security Configuration
 BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+BCRYPT_MAX_CONCURRENCY = int(os.getenv("BCRYPT_MAX_CONCURRENCY", "2"))  # hashes running at once per worker
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "32"))  # waiting hashes before logins get 503
+BCRYPT_QUEUE_TIMEOUT = float(os.getenv("BCRYPT_QUEUE_TIMEOUT", "10"))  # seconds
+BCRYPT_CALIBRATE_ON_STARTUP = os.getenv("BCRYPT_CALIBRATE_ON_STARTUP", "True").lower() == "true"
 
 # Rate Limiting
 RATELIMIT_DEFAULT = os.getenv("RATELIMIT_DEFAULT", "200 per day;50 per hour")
+
+# Bulk Import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_BATCH_SIZE = int(os.getenv("IMPORT_MAX_BATCH_SIZE", "10000"))
+
+# Dashboard Counters
+COUNTERS_RECONCILE_INTERVAL = int(os.getenv("COUNTERS_RECONCILE_INTERVAL", "900"))  # seconds, 0 disables
+
+# Cohort Analytics (in-memory columnar patient snapshot, requires numpy)
+COHORT_REFRESH_INTERVAL = int(os.getenv("COHORT_REFRESH_INTERVAL", "300"))  # seconds between incremental refreshes
+COHORT_FULL_REBUILD_INTERVAL = int(os.getenv("COHORT_FULL_REBUILD_INTERVAL", "3600"))  # seconds between full rebuilds
+
+# Analytics Cache (per worker process; per-endpoint TTLs are set on the routes)
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "512"))
+ANALYTICS_CACHE_MAX_STALE = int(os.getenv("ANALYTICS_CACHE_MAX_STALE", "600"))  # seconds a stale body may be served
+
+# Bulk Appointment Updates
+BULK_UPDATE_MAX_OPERATIONS = int(os.getenv("BULK_UPDATE_MAX_OPERATIONS", "500"))
+
+# Response Cache (per worker process)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))  # seconds
+
+# Appointment Availability Cache (per worker process)
+AVAILABILITY_CACHE_MAX_ENTRIES = int(os.getenv("AVAILABILITY_CACHE_MAX_ENTRIES", "50000"))  # (day, doctor) bitmaps
+AVAILABILITY_CACHE_TTL = int(os.getenv("AVAILABILITY_CACHE_TTL", "300"))  # seconds
+
+# Backups (compressed Extended JSON, written by a background job)
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "gzip")  # gzip or zstd (requires zstandard)
+BACKUP_COMPRESSION_LEVEL = int(os.getenv("BACKUP_COMPRESSION_LEVEL", "0"))  # 0 uses the codec default
+BACKUP_BATCH_SIZE = int(os.getenv("BACKUP_BATCH_SIZE", "1000"))  # documents per cursor batch
+BACKUP_STALE_SECONDS = int(os.getenv("BACKUP_STALE_SECONDS", "900"))  # silent running jobs count as failed
+
+# Audit Logging
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "365"))  # 0 keeps logs forever
+AUDIT_DURABLE = os.getenv("AUDIT_DURABLE", "False").lower() == "true"  # write before responding
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))  # seconds
+AUDIT_ENQUEUE_TIMEOUT = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", "0.05"))  # seconds before dropping
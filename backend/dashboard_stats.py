@@ -0,0 +1,74 @@
+"""Dashboard statistics computed with as few round trips as possible.
+
+Dashboards normally read the precomputed documents kept by ``stats_counters``.
+The functions here compute the same numbers from source, for use before the
+counters exist: per-doctor appointment stats come from one aggregation (an
+indexed ``$match`` on ``doctor_id`` followed by a ``$facet`` that groups by
+status and counts in the same pass), and only the collections a role's
+dashboard shows are queried at all.
+"""
+
+APPOINTMENT_DASHBOARD_INDEX = [('doctor_id', 1), ('status', 1)]
+# createdAt second so doctor performance can filter by registration date on the same index
+PATIENT_DASHBOARD_INDEX = [('assigned_doctor', 1), ('createdAt', 1)]
+STAFF_FILTER = {'role': {'$ne': 'patient'}}
+
+
+def appointment_stats(collection, match):
+    """{'total': n, 'byStatus': {status: n}} for appointments matching match, in one aggregation"""
+    pipeline = [
+        {'$match': match},
+        {'$facet': {
+            'total': [{'$count': 'n'}],
+            'byStatus': [{'$group': {'_id': '$status', 'n': {'$sum': 1}}}]
+        }}
+    ]
+    result = next(collection.aggregate(pipeline), {})
+    total = result.get('total') or [{'n': 0}]
+    return {
+        'total': total[0]['n'],
+        'byStatus': {group['_id']: group['n'] for group in result.get('byStatus', [])}
+    }
+
+
+def doctor_stats(appointments, patients, doctor_id):
+    """Dashboard stats for one doctor: one appointments aggregation plus one indexed count"""
+    appointment_counts = appointment_stats(appointments, {'doctor_id': doctor_id})
+    return {
+        "todayAppointments": appointment_counts['total'],
+        "completedAppointments": appointment_counts['byStatus'].get('completed', 0),
+        "pendingAppointments": appointment_counts['byStatus'].get('pending', 0),
+        "totalPatients": patients.count_documents({'assigned_doctor': doctor_id})
+    }
+
+
+def collection_totals(patients=None, users=None, appointments=None):
+    """Totals for just the collections passed in"""
+    totals = {}
+    if patients is not None:
+        totals['totalPatients'] = patients.count_documents({})
+    if users is not None:
+        totals['totalStaff'] = users.count_documents(STAFF_FILTER)
+    if appointments is not None:
+        totals['totalAppointments'] = appointments.count_documents({})
+    return totals
+
+
+def doctor_stats_from_counters(counters):
+    """doctor_stats() shape from a doctor:<id> counters document"""
+    by_status = counters.get('byStatus', {})
+    return {
+        "todayAppointments": counters.get('appointments', 0),
+        "completedAppointments": by_status.get('completed', 0),
+        "pendingAppointments": by_status.get('pending', 0),
+        "totalPatients": counters.get('patients', 0)
+    }
+
+
+def totals_from_counters(counters):
+    """collection_totals() shape from the totals counters document"""
+    return {
+        'totalPatients': counters.get('patients', 0),
+        'totalStaff': counters.get('staff', 0),
+        'totalAppointments': counters.get('appointments', 0)
+    }
@@ -0,0 +1,105 @@
+"""Streaming CSV/NDJSON encoders for export endpoints.
+
+The generators here consume a MongoDB cursor lazily and yield encoded byte
+chunks, so an export holds at most one chunk in memory regardless of how many
+documents it covers.
+"""
+import csv
+import datetime
+import io
+import json
+import zlib
+
+from bson import ObjectId
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+PATIENT_EXPORT_COLUMNS = [
+    '_id', 'patient_id', 'firstName', 'lastName', 'email', 'phone', 'age', 'gender',
+    'status', 'medicalHistory', 'assigned_doctor', 'createdAt', 'updatedAt'
+]
+APPOINTMENT_EXPORT_COLUMNS = [
+    '_id', 'name', 'email', 'phone', 'date', 'time', 'startAt', 'doctor_id', 'status',
+    'createdAt', 'updatedAt'
+]
+AUDIT_LOG_EXPORT_COLUMNS = [
+    '_id', 'timestamp', 'action', 'user_id', 'ip_address', 'user_agent', 'details'
+]
+
+# Flush encoded output once this many bytes are buffered
+CHUNK_SIZE = 64 * 1024
+CURSOR_BATCH_SIZE = 1000
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return '; '.join(str(_csv_value(v)) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, default=str, sort_keys=True)
+    return value
+
+
+def iter_csv(documents, columns):
+    """Yield CSV bytes for documents, one header row then one row per document"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for document in documents:
+        writer.writerow([_csv_value(document.get(column)) for column in columns])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(documents, dumps):
+    """Yield newline-delimited JSON bytes, encoding each document with dumps"""
+    lines = []
+    size = 0
+    for document in documents:
+        line = dumps(document)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_SIZE:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+            size = 0
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compress a stream of byte chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(documents, export_format, columns, dumps, gzip=False):
+    """Build the byte stream for an export in the requested format"""
+    if export_format == 'csv':
+        chunks = iter_csv(documents, columns)
+    else:
+        chunks = iter_ndjson(documents, dumps)
+    return gzip_stream(chunks) if gzip else chunks
+
+
+def export_filename(prefix, export_format, gzip=False):
+    """Timestamped attachment filename for an export"""
+    timestamp = datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    extension = EXPORT_FORMATS[export_format][1]
+    return f"{prefix}_{timestamp}.{extension}{'.gz' if gzip else ''}"
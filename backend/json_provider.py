@@ -0,0 +1,76 @@
+"""App-wide JSON provider that understands BSON types.
+
+Routes can hand MongoDB documents straight to ``jsonify``: ObjectId becomes its
+hex string, datetimes/dates become ISO 8601 strings and Decimal128 becomes a
+decimal string, however deeply they are nested. orjson is used when installed;
+otherwise the standard library encoder is used with the same conversions.
+"""
+import datetime
+import decimal
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def bson_default(o):
+    """Convert the BSON/Python types the JSON encoders do not handle natively"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+        return o.isoformat()
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if isinstance(o, bytes):
+        return o.decode('utf-8', errors='replace')
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """JSON provider encoding ObjectId, datetime and Decimal128 natively"""
+
+    # Key order is irrelevant to API clients and sorting costs time on large lists
+    sort_keys = False
+
+    @staticmethod
+    def default(o):
+        return bson_default(o)
+
+    def _orjson_dumps(self, obj):
+        # orjson rejects integers wider than 64 bits; fall back for those
+        try:
+            return orjson.dumps(obj, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return None
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            encoded = self._orjson_dumps(obj)
+            if encoded is not None:
+                return encoded.decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, so Flask's
+        # bad-request handling keeps working
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        encoded = self._orjson_dumps(obj)
+        if encoded is None:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(encoded + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Script to normalize appointment dates/times and backfill startAt datetimes
+Run once after upgrading: dates and times are rewritten to one canonical form
+('2099-12-31', '09:30 AM') so the unique slot index catches every double
+booking, that index is created, and appointments booked before startAt
+existed get one for calendar range queries. Pass --all to recompute startAt
+on every appointment.
+"""
+
+import sys
+from pymongo import MongoClient
+import config
+from appointment_time import (
+    START_AT_FIELD, APPOINTMENT_SLOT_INDEX, APPOINTMENT_SLOT_KEYS, backfill_start_at, normalize_appointment_times
+)
+
+def migrate_start_at(recompute_all=False):
+    """Normalize dates/times, build the slot index and backfill startAt for the appointments collection"""
+
+    # Connect to MongoDB
+    try:
+        client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
+        client.admin.command('ping')
+        print("✅ Connected to MongoDB")
+    except Exception as e:
+        print(f"❌ Failed to connect to MongoDB: {e}")
+        return False
+
+    appointments_collection = client[config.DB_NAME]['appointments']
+    normalized, conflicts = normalize_appointment_times(appointments_collection)
+    print(f"🕘 Normalized the date/time on {normalized} appointments")
+    if conflicts:
+        print(f"⚠️  {conflicts} appointments double-book a slot once normalized; they keep their old date and time")
+
+    try:
+        appointments_collection.create_index(
+            APPOINTMENT_SLOT_KEYS, unique=True, name=APPOINTMENT_SLOT_INDEX, background=True
+        )
+        print("🔒 Unique appointment slot index in place")
+    except Exception as e:
+        print(f"❌ Could not create the unique slot index (resolve duplicate bookings first): {e}")
+        return False
+
+    appointments_collection.create_index([(START_AT_FIELD, 1), ("_id", 1)], background=True)
+
+    updated = backfill_start_at(appointments_collection, only_missing=not recompute_all)
+    unparsed = appointments_collection.count_documents({START_AT_FIELD: None})
+    print(f"📅 Set startAt on {updated} appointments")
+    if unparsed:
+        print(f"⚠️  {unparsed} appointments have a date that could not be parsed (startAt is null)")
+    return True
+
+if __name__ == "__main__":
+    print("🏥 Healthcare System - Appointment startAt Migration")
+    print("=" * 50)
+
+    if not migrate_start_at(recompute_all='--all' in sys.argv):
+        sys.exit(1)
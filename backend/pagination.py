@@ -0,0 +1,86 @@
+"""Keyset (cursor) pagination helpers for MongoDB list endpoints"""
+import base64
+
+from bson import json_util
+
+# Sort keys the patient list endpoints accept. Each one is backed by a
+# compound (field, _id) index created in create_database_indexes().
+PATIENT_SORT_FIELDS = ('createdAt', 'updatedAt', 'firstName', 'lastName', 'email', 'phone')
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor token we cannot decode"""
+
+
+def encode_cursor(document, sort_by):
+    """Build an opaque cursor from the last document of a page"""
+    payload = {'k': sort_by, 'v': document.get(sort_by), 'id': document['_id']}
+    raw = json_util.dumps(payload, json_options=json_util.CANONICAL_JSON_OPTIONS)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_by):
+    """Decode a cursor token and check it was issued for the same sort key"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload['k'] != sort_by:
+            raise InvalidCursor('Cursor does not match sortBy')
+        return payload['v'], payload['id']
+    except InvalidCursor:
+        raise
+    except Exception:
+        raise InvalidCursor('Malformed cursor')
+
+
+def keyset_filter(sort_by, direction, last_value, last_id):
+    """Return a filter selecting the documents that come after (last_value, last_id)"""
+    op = '$lt' if direction == -1 else '$gt'
+
+    # Missing values sort before everything else, so they need their own branches
+    if last_value is None:
+        if direction == -1:
+            return {sort_by: None, '_id': {op: last_id}}
+        return {'$or': [
+            {sort_by: {'$ne': None}},
+            {sort_by: None, '_id': {op: last_id}}
+        ]}
+
+    branches = [
+        {sort_by: {op: last_value}},
+        {sort_by: last_value, '_id': {op: last_id}}
+    ]
+    if direction == -1:
+        branches.append({sort_by: None})
+    return {'$or': branches}
+
+
+def merge_filters(*filters):
+    """AND together the non-empty filters"""
+    filters = [f for f in filters if f]
+    if not filters:
+        return {}
+    if len(filters) == 1:
+        return filters[0]
+    return {'$and': filters}
+
+
+def fetch_keyset_page(collection, base_filter, sort_by, direction, limit, cursor=None, projection=None):
+    """Fetch one page in keyset mode and return (documents, next_cursor)"""
+    query = base_filter
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, sort_by)
+        query = merge_filters(base_filter, keyset_filter(sort_by, direction, last_value, last_id))
+
+    # Read one extra document to know whether another page exists
+    documents = list(collection.find(query, projection)
+                     .sort([(sort_by, direction), ('_id', direction)])
+                     .limit(limit + 1))
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1], sort_by)
+    return documents, next_cursor
@@ -0,0 +1,105 @@
+"""Bounded executor for bcrypt hashing and verification.
+
+bcrypt at cost 12 takes hundreds of milliseconds of CPU. Running it on a
+small dedicated pool caps how many cores login traffic can burn at once, and
+a bounded queue rejects excess logins quickly instead of letting them pile up
+behind each other. bcrypt releases the GIL, so with threaded gunicorn workers
+the read APIs keep being served while a hash runs.
+"""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full or a job waited too long"""
+
+
+class HashingExecutor:
+    """Runs bcrypt calls on a capped thread pool and records queue/run times"""
+
+    def __init__(self, max_concurrency=2, max_queue=32, timeout_seconds=10):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='bcrypt')
+        # Running + waiting jobs; acquiring fails fast once the queue is full
+        self._slots = threading.BoundedSemaphore(max_concurrency + max_queue)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+        self.calibration = None
+
+    def _run(self, fn, args, submitted_at):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                waited = started - submitted_at
+                self.completed += 1
+                self.queue_seconds_total += waited
+                self.queue_seconds_max = max(self.queue_seconds_max, waited)
+                self.run_seconds_total += finished - started
+            self._slots.release()
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the pool and wait for the result"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy("Password hashing queue is full")
+        future = self._pool.submit(self._run, fn, args, time.perf_counter())
+        try:
+            return future.result(timeout=self.timeout_seconds)
+        except FutureTimeout:
+            # The job still finishes (and frees its slot); the caller just stops waiting
+            with self._lock:
+                self.timed_out += 1
+            raise HashingBusy("Password hashing timed out")
+
+    def check_password(self, password, hashed):
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        return self.submit(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    def hash_password(self, password, rounds):
+        return self.submit(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds))
+
+    def calibrate(self, rounds, samples=3):
+        """Measure the real per-hash latency for this cost factor on this host"""
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            bcrypt.hashpw(b'calibration-password', bcrypt.gensalt(rounds))
+            timings.append(time.perf_counter() - started)
+        self.calibration = {
+            "rounds": rounds,
+            "samples": samples,
+            "medianMs": round(statistics.median(timings) * 1000, 1),
+            "maxLoginsPerSecond": round(self.max_concurrency / statistics.median(timings), 1)
+        }
+        return self.calibration
+
+    def stats(self):
+        with self._lock:
+            completed = self.completed
+            return {
+                "maxConcurrency": self.max_concurrency,
+                "maxQueue": self.max_queue,
+                "completed": completed,
+                "rejected": self.rejected,
+                "timedOut": self.timed_out,
+                "avgQueueMs": round(self.queue_seconds_total / completed * 1000, 2) if completed else None,
+                "maxQueueMs": round(self.queue_seconds_max * 1000, 2),
+                "avgHashMs": round(self.run_seconds_total / completed * 1000, 2) if completed else None,
+                "calibration": self.calibration
+            }
@@ -0,0 +1,59 @@
+"""Sparse fieldsets: turn a ``fields=`` query parameter into a Mongo projection.
+
+Each collection has an allow-list of fields clients may request, so a
+projection can never expose password hashes or internal search data.
+"""
+
+FIELD_ALLOW_LISTS = {
+    'patients': frozenset({
+        '_id', 'patient_id', 'firstName', 'lastName', 'name', 'email', 'phone', 'age',
+        'gender', 'dateOfBirth', 'status', 'address', 'bloodType', 'allergies',
+        'medicalHistory', 'emergencyContact', 'assigned_doctor', 'createdAt', 'updatedAt'
+    }),
+    'appointments': frozenset({
+        '_id', 'name', 'email', 'phone', 'date', 'time', 'startAt', 'doctor_id', 'doctor',
+        'department', 'reason', 'notes', 'status', 'createdAt', 'updatedAt'
+    }),
+    'users': frozenset({
+        '_id', 'name', 'email', 'role', 'specialization', 'department', 'phone', 'isActive',
+        'createdAt', 'lastLogin'
+    }),
+}
+
+# Columns of the staff portal patient table. The covering index below holds all
+# of them, so a table page sorted by createdAt is answered from the index alone.
+PATIENT_TABLE_FIELDS = (
+    'firstName', 'lastName', 'name', 'email', 'phone', 'gender', 'status', 'dateOfBirth'
+)
+
+# Sort keys whose (field, _id) index is replaced by a wider covering index
+PATIENT_COVERING_INDEXES = {
+    'createdAt': [('createdAt', 1), ('_id', 1)] + [(field, 1) for field in PATIENT_TABLE_FIELDS],
+}
+
+
+class InvalidFields(ValueError):
+    """Raised when fields= names something outside the collection's allow-list"""
+
+
+def parse_fields(value, collection, required=()):
+    """Build an inclusion projection from a comma separated fields value.
+
+    Returns None when no fields were requested so callers keep their default
+    projection. ``required`` fields (e.g. the keyset sort key) are always added.
+    """
+    if not value:
+        return None
+
+    requested = [f.strip() for f in value.split(',') if f.strip()]
+    allowed = FIELD_ALLOW_LISTS[collection]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise InvalidFields(f"Unknown or restricted fields: {', '.join(sorted(unknown))}")
+
+    projection = {field: 1 for field in requested}
+    for field in required:
+        projection[field] = 1
+    # _id is always returned; list endpoints rely on it as the row key
+    projection['_id'] = 1
+    return projection
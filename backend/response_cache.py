@@ -0,0 +1,102 @@
+"""In-process LRU cache of serialized JSON responses with ETag support.
+
+Entries are bounded by count, total bytes and age. Each entry carries tags
+(e.g. ``patients:list`` or ``patient:<id>``) so write routes can invalidate
+exactly the responses they affect. The cache is per worker process; the TTL
+bounds how stale another worker's entries can get after a write.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+CacheEntry = namedtuple('CacheEntry', 'body mimetype etag last_modified tags expires_at')
+
+
+def body_etag(body):
+    """Strong ETag value for a response body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of response bodies keyed by request path"""
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024, ttl_seconds=30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so in-flight fills never store stale data
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype, last_modified=None, tags=(), generation=None):
+        """Store a body and return its entry (returned uncached if it is too big or stale)"""
+        entry = CacheEntry(body, mimetype, body_etag(body), last_modified, frozenset(tags),
+                           time.monotonic() + self.ttl_seconds)
+        # A single response may take at most a quarter of the budget
+        if len(body) > self.max_bytes // 4:
+            return entry
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of the given tags"""
+        tags = set(tags)
+        with self._lock:
+            self.generation += 1
+            stale = [key for key, entry in self._entries.items() if entry.tags & tags]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxEntries": self.max_entries,
+                "maxBytes": self.max_bytes,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else None
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
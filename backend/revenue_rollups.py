@@ -0,0 +1,119 @@
+"""Monthly revenue rollups with a watermark.
+
+Closed months never change except through deletes, so their totals are
+stored in ``revenue_monthly`` as one ``{_id: 'YYYY-MM', revenue,
+patient_count}`` document each. A ``watermark`` document records the start
+of the first month that is still open. Whenever the calendar moves past the
+watermark, the months in between are aggregated once and stored. Reads merge
+the stored months with a live aggregate over the open month only, which the
+``createdAt`` index keeps small. Deleting a patient from a closed month
+decrements that month in place.
+"""
+import datetime
+import threading
+
+from pymongo import ReplaceOne
+
+WATERMARK_ID = 'watermark'
+# Mock revenue until billing exists: $100 per registered patient
+REVENUE_PER_PATIENT = 100
+
+
+def month_key(value):
+    return value.strftime('%Y-%m')
+
+
+def month_start(value):
+    return datetime.datetime(value.year, value.month, 1)
+
+
+def parse_month(value):
+    """'YYYY-MM' (or a longer ISO date) to that month's key; raises ValueError"""
+    return month_key(datetime.datetime.strptime(value[:7], '%Y-%m'))
+
+
+def _monthly_pipeline(match):
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'$dateToString': {'format': '%Y-%m', 'date': '$createdAt'}},
+            'revenue': {'$sum': REVENUE_PER_PATIENT},
+            'patient_count': {'$sum': 1}
+        }},
+        {'$sort': {'_id': 1}}
+    ]
+
+
+class RevenueRollups:
+    """Stored closed-month totals plus a live open-month aggregate"""
+
+    def __init__(self, rollups, patients):
+        self.rollups = rollups
+        self.patients = patients
+        self._lock = threading.Lock()
+
+    def watermark(self):
+        document = self.rollups.find_one({'_id': WATERMARK_ID})
+        return document['closedBefore'] if document else None
+
+    def close_months(self, now=None):
+        """Store every month before the current one that is not stored yet; returns months written"""
+        current = month_start(now or datetime.datetime.utcnow())
+        with self._lock:
+            watermark = self.watermark()
+            if watermark is not None and watermark >= current:
+                return 0
+            created = {'$lt': current}
+            if watermark is not None:
+                created['$gte'] = watermark
+            months = list(self.patients.aggregate(_monthly_pipeline({'createdAt': created})))
+            if months:
+                self.rollups.bulk_write([
+                    ReplaceOne({'_id': month['_id']}, {**month, 'closedAt': datetime.datetime.utcnow()}, upsert=True)
+                    for month in months
+                ], ordered=False)
+            self.rollups.replace_one({'_id': WATERMARK_ID}, {'_id': WATERMARK_ID, 'closedBefore': current}, upsert=True)
+            return len(months)
+
+    def rebuild(self, now=None):
+        """Drop every stored month and aggregate history again"""
+        with self._lock:
+            self.rollups.delete_many({})
+        return self.close_months(now)
+
+    def patient_removed(self, created_at):
+        """Take a deleted patient out of its month if that month is already closed"""
+        if not isinstance(created_at, datetime.datetime):
+            return
+        watermark = self.watermark()
+        if watermark is not None and created_at < watermark:
+            self.rollups.update_one(
+                {'_id': month_key(created_at)},
+                {'$inc': {'revenue': -REVENUE_PER_PATIENT, 'patient_count': -1}}
+            )
+
+    def monthly(self, from_month=None, to_month=None, now=None):
+        """[{_id: 'YYYY-MM', revenue, patient_count}] for from_month..to_month inclusive"""
+        now = now or datetime.datetime.utcnow()
+        self.close_months(now)
+        current = month_start(now)
+        current_key = month_key(current)
+
+        month_filter = {'$lt': current_key}
+        if from_month:
+            month_filter['$gte'] = from_month
+        if to_month and to_month < current_key:
+            month_filter['$lte'] = to_month
+        stored = list(self.rollups.find(
+            {'_id': month_filter}, {'revenue': 1, 'patient_count': 1}
+        ).sort('_id', 1))
+        stored = [month for month in stored if month['patient_count'] > 0]
+
+        if to_month and to_month < current_key:
+            return stored
+        # Open month (and anything dated after it) straight from patients
+        live = list(self.patients.aggregate(_monthly_pipeline({'createdAt': {'$gte': current}})))
+        return stored + [
+            month for month in live
+            if (not from_month or month['_id'] >= from_month) and (not to_month or month['_id'] <= to_month)
+        ]
@@ -0,0 +1,135 @@
+"""Token/edge n-gram search index for patients.
+
+Every patient document carries a ``searchTokens`` array holding the edge
+n-grams (prefixes) of its normalized name, email and phone words. Tokens are
+namespaced by field (``n:`` name, ``e:`` email, ``p:`` phone) so callers can
+search one field or all of them, and a multikey index on the array turns
+every search into an index lookup instead of a collection scan.
+"""
+import re
+import unicodedata
+
+from pymongo import UpdateOne
+
+SEARCH_TOKENS_FIELD = 'searchTokens'
+
+# Document fields that feed the search tokens, grouped by namespace
+SEARCH_SOURCE_FIELDS = {
+    'n': ('firstName', 'lastName', 'name'),
+    'e': ('email',),
+    'p': ('phone',),
+}
+SEARCHABLE_FIELDS = tuple(f for fields in SEARCH_SOURCE_FIELDS.values() for f in fields)
+
+MIN_GRAM = 1
+MAX_GRAM = 20
+
+_WORD_SPLIT = re.compile(r'[^0-9a-z]+')
+_NON_DIGIT = re.compile(r'\D+')
+_PHONE_LIKE = re.compile(r'^[\d\s().+-]*\d[\d\s().+-]*$')
+
+
+def normalize(text):
+    """Lowercase, strip accents and split text into alphanumeric words"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return [w for w in _WORD_SPLIT.split(text) if w]
+
+
+def phone_digits(value):
+    """Return only the digits of a phone number"""
+    return _NON_DIGIT.sub('', str(value or ''))
+
+
+def edge_ngrams(word):
+    """Return the prefixes of word between MIN_GRAM and MAX_GRAM characters"""
+    return [word[:i] for i in range(MIN_GRAM, min(len(word), MAX_GRAM) + 1)]
+
+
+def _words_for(namespace, value):
+    if namespace == 'p':
+        digits = phone_digits(value)
+        if not digits:
+            return []
+        # Also index the national number so searches without a country code match
+        return [digits, digits[-10:]] if len(digits) > 10 else [digits]
+    words = normalize(value)
+    if namespace == 'e' and value:
+        # Keep the whole local part so "john.smith" matches as typed
+        local_part = str(value).lower().split('@', 1)[0]
+        words.append(''.join(normalize(local_part)))
+    return words
+
+
+def build_search_tokens(document):
+    """Compute the sorted search token list for a patient document"""
+    tokens = set()
+    for namespace, fields in SEARCH_SOURCE_FIELDS.items():
+        for field in fields:
+            for word in _words_for(namespace, document.get(field)):
+                tokens.update(f'{namespace}:{gram}' for gram in edge_ngrams(word))
+    return sorted(tokens)
+
+
+def _query_tokens(namespace, word):
+    if namespace == 'p':
+        word = phone_digits(word)
+    return f'{namespace}:{word[:MAX_GRAM]}' if word else None
+
+
+def search_filter(term, namespaces=('n', 'e', 'p')):
+    """Build an indexed filter matching documents where every word of term
+    is a prefix of a word in one of the given namespaces"""
+    if not term:
+        return {}
+
+    words = normalize(term)
+    if 'p' in namespaces and _PHONE_LIKE.match(term):
+        # "+1 (555) 010-2000" is one phone number, not four words
+        candidates = [_query_tokens('p', term)]
+        if len(words) == 1:
+            candidates += [_query_tokens(ns, words[0]) for ns in namespaces if ns != 'p']
+        return {SEARCH_TOKENS_FIELD: {'$in': [t for t in candidates if t]}}
+
+    clauses = []
+    for word in words:
+        candidates = [t for t in (_query_tokens(ns, word) for ns in namespaces) if t]
+        if candidates:
+            clauses.append({SEARCH_TOKENS_FIELD: {'$in': candidates}})
+
+    if not clauses:
+        # Nothing searchable (e.g. only punctuation): match nothing
+        return {SEARCH_TOKENS_FIELD: {'$in': []}}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {'$and': clauses}
+
+
+def touches_search_fields(update_data):
+    """Whether an update changes any field that feeds the search tokens"""
+    return any(field in update_data for field in SEARCHABLE_FIELDS)
+
+
+def search_projection():
+    """Projection loading only the fields needed to rebuild tokens"""
+    return {field: 1 for field in SEARCHABLE_FIELDS}
+
+
+def backfill_search_tokens(collection, batch_size=1000, only_missing=True):
+    """Rebuild search tokens in batches; returns the number of documents updated"""
+    query = {SEARCH_TOKENS_FIELD: {'$exists': False}} if only_missing else {}
+    updated = 0
+    batch = []
+    for document in collection.find(query, search_projection()).batch_size(batch_size):
+        batch.append(UpdateOne(
+            {'_id': document['_id']},
+            {'$set': {SEARCH_TOKENS_FIELD: build_search_tokens(document)}}
+        ))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
@@ -2,6 +2,7 @@
 from pymongo import MongoClient
 import config
 import uuid
+from search_index import SEARCH_TOKENS_FIELD, build_search_tokens
 
 client = MongoClient(config.MONGO_URI)
 db = client[config.DB_NAME]
@@ -35,5 +36,9 @@ dummy_patients = [
     # ➕ Add more entries here
 ]
 
+# Seeded patients need search tokens like any other, or search never finds them
+for patient in dummy_patients:
+    patient[SEARCH_TOKENS_FIELD] = build_search_tokens(patient)
+
 patients_collection.insert_many(dummy_patients)
 print("Dummy data inserted successfully.")
@@ -0,0 +1,252 @@
+"""Incrementally maintained dashboard counters.
+
+Dashboard totals live in a small ``stats_counters`` collection: one
+``totals`` document and one ``doctor:<id>`` document per doctor. Write routes
+report each change as (before, after) documents, and the difference between
+what the old and new versions contributed is applied with a single ``$inc``
+per counter document, so concurrent writers never overwrite each other.
+
+The source write and the counter update are not one transaction. A
+background reconciler therefore rebuilds every counter from the source
+collections on an interval, or sooner when a caller asks for it, e.g. after
+bulk imports or a failed counter write. Every ``$inc`` also bumps a ``_v``
+version, and the reconciler only replaces a counter whose version is still
+the one it read before aggregating, so it never overwrites a concurrent
+increment; skipped counters are corrected on a later pass.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from dashboard_stats import STAFF_FILTER
+
+logger = logging.getLogger(__name__)
+
+TOTALS_ID = 'totals'
+VERSION_FIELD = '_v'
+
+
+def doctor_counter_id(doctor_id):
+    return f'doctor:{doctor_id}'
+
+
+def counter_key(value):
+    """Make a status usable as a field name"""
+    if value is None or value == '':
+        return 'none'
+    return str(value).replace('.', '_').lstrip('$') or 'none'
+
+
+def contributions(kind, document):
+    """What one document adds to each counter: {counter_id: {field: n}}"""
+    if not document:
+        return {}
+    if kind == 'patient':
+        counts = {TOTALS_ID: {'patients': 1}}
+        if document.get('assigned_doctor'):
+            counts[doctor_counter_id(document['assigned_doctor'])] = {'patients': 1}
+        return counts
+    if kind == 'user':
+        return {TOTALS_ID: {'staff': 1}} if document.get('role') != 'patient' else {}
+    if kind == 'appointment':
+        status = counter_key(document.get('status'))
+        counts = {TOTALS_ID: {'appointments': 1, f'appointmentsByStatus.{status}': 1}}
+        if document.get('doctor_id'):
+            counts[doctor_counter_id(document['doctor_id'])] = {'appointments': 1, f'byStatus.{status}': 1}
+        return counts
+    raise ValueError(f"Unknown counter kind: {kind}")
+
+
+class StatsCounters:
+    """$inc-maintained counters plus a background reconciler"""
+
+    def __init__(self, collection, sources, reconcile_interval=900):
+        self.collection = collection
+        # {'patients': ..., 'users': ..., 'appointments': ...} to rebuild from
+        self.sources = sources
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.increments = 0
+        self.increment_errors = 0
+        self.reconciles = 0
+        self.reconcile_errors = 0
+        self.last_reconcile_ms = None
+        self.last_corrections = None
+        self.last_skipped = None
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so (re)start in each worker process
+        if not self.reconcile_interval:
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='stats-reconciler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.reconcile_interval)
+            self._wake.clear()
+            try:
+                self.reconcile()
+            except Exception as e:
+                with self._lock:
+                    self.reconcile_errors += 1
+                logger.error(f"Stats counter reconcile failed: {e}")
+
+    def request_reconcile(self):
+        """Ask the background reconciler to rebuild soon"""
+        self._ensure_started()
+        self._wake.set()
+
+    def apply(self, kind, before=None, after=None):
+        """Record that a document changed from before to after (either may be None)"""
+        self.apply_many(kind, [(before, after)])
+
+    def apply_many(self, kind, changes):
+        """Record several (before, after) changes with one round of $inc updates"""
+        delta = defaultdict(lambda: defaultdict(int))
+        for before, after in changes:
+            for sign, document in ((-1, before), (1, after)):
+                for counter_id, fields in contributions(kind, document).items():
+                    for field, n in fields.items():
+                        delta[counter_id][field] += sign * n
+        self.increment(delta)
+
+    def increment(self, changes):
+        """Apply {counter_id: {field: n}} with one $inc per counter document"""
+        operations = [
+            UpdateOne({'_id': counter_id}, {'$inc': {**nonzero, VERSION_FIELD: 1}}, upsert=True)
+            for counter_id, fields in changes.items()
+            for nonzero in [{f: n for f, n in fields.items() if n}]
+            if nonzero
+        ]
+        if not operations:
+            return
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+            with self._lock:
+                self.increments += len(operations)
+        except Exception as e:
+            # Counters drift until the next rebuild; never fail the request for it
+            with self._lock:
+                self.increment_errors += 1
+            logger.error(f"Stats counter update failed: {e}")
+            self.request_reconcile()
+
+    def totals(self):
+        self._ensure_started()
+        return self.collection.find_one({'_id': TOTALS_ID})
+
+    def doctor(self, doctor_id):
+        self._ensure_started()
+        return self.collection.find_one({'_id': doctor_counter_id(doctor_id)})
+
+    def reconcile(self):
+        """Rebuild every counter from the source collections; returns the number corrected"""
+        started = time.perf_counter()
+        patients = self.sources['patients']
+        users = self.sources['users']
+        appointments = self.sources['appointments']
+
+        # Read counters (and their versions) before the sources: any later write bumps the version
+        current = {doc['_id']: doc for doc in self.collection.find({})}
+
+        rebuilt = defaultdict(lambda: defaultdict(int))
+        rebuilt[TOTALS_ID].update(patients=0, appointments=0, staff=users.count_documents(STAFF_FILTER))
+        for group in patients.aggregate([{'$group': {'_id': '$assigned_doctor', 'n': {'$sum': 1}}}]):
+            rebuilt[TOTALS_ID]['patients'] += group['n']
+            if group['_id']:
+                rebuilt[doctor_counter_id(group['_id'])]['patients'] += group['n']
+        for group in appointments.aggregate([
+            {'$group': {'_id': {'doctor_id': '$doctor_id', 'status': '$status'}, 'n': {'$sum': 1}}}
+        ]):
+            document = {'doctor_id': group['_id'].get('doctor_id'), 'status': group['_id'].get('status')}
+            for counter_id, fields in contributions('appointment', document).items():
+                for field, n in fields.items():
+                    rebuilt[counter_id][field] += n * group['n']
+
+        now = datetime.datetime.utcnow()
+        corrections = skipped = 0
+        for counter_id, fields in rebuilt.items():
+            existing = current.get(counter_id, {})
+            document = self._nest(counter_id, fields, now)
+            if self._counts(existing) == self._counts(document):
+                continue
+            version = existing.get(VERSION_FIELD)
+            document[VERSION_FIELD] = (version or 0) + 1
+            try:
+                # Compare-and-swap on the version read above; a miss means a write raced us
+                result = self.collection.replace_one(
+                    {'_id': counter_id, VERSION_FIELD: version}, document, upsert=True
+                )
+                applied = bool(result.matched_count) or result.upserted_id is not None
+            except DuplicateKeyError:
+                applied = False
+            corrections += applied
+            skipped += not applied
+        for counter_id in set(current) - set(rebuilt):
+            if not self._counts(current[counter_id]):
+                continue
+            deleted = self.collection.delete_one(
+                {'_id': counter_id, VERSION_FIELD: current[counter_id].get(VERSION_FIELD)}
+            ).deleted_count
+            corrections += deleted
+            skipped += 1 - deleted
+
+        with self._lock:
+            self.reconciles += 1
+            self.last_reconcile_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.last_corrections = corrections
+            self.last_skipped = skipped
+        if skipped:
+            logger.info(f"Stats counter reconcile skipped {skipped} counters changed by concurrent writes")
+        return corrections
+
+    @staticmethod
+    def _nest(counter_id, fields, now):
+        document = {'_id': counter_id}
+        for field, n in fields.items():
+            if '.' in field:
+                parent, child = field.split('.', 1)
+                document.setdefault(parent, {})[child] = n
+            else:
+                document[field] = n
+        document['reconciledAt'] = now
+        return document
+
+    @staticmethod
+    def _counts(document):
+        """Counter values without metadata or zero entries left behind by $inc"""
+        counts = {}
+        for key, value in document.items():
+            if isinstance(value, dict):
+                value = {k: v for k, v in value.items() if v}
+            if key not in ('_id', 'reconciledAt', VERSION_FIELD) and value:
+                counts[key] = value
+        return counts
+
+    def stats(self):
+        with self._lock:
+            return {
+                "increments": self.increments,
+                "incrementErrors": self.increment_errors,
+                "reconciles": self.reconciles,
+                "reconcileErrors": self.reconcile_errors,
+                "reconcileIntervalSeconds": self.reconcile_interval,
+                "lastReconcileMs": self.last_reconcile_ms,
+                "lastCorrections": self.last_corrections,
+                "lastSkipped": self.last_skipped
+            }
@@ -0,0 +1,57 @@
+"""Database size and cache statistics from storage metadata.
+
+Everything here comes from ``$collStats`` storage stats and
+``serverStatus``, which the server keeps up to date. No collection
+documents are read, so the cost does not grow with the data.
+"""
+from pymongo.errors import OperationFailure
+
+MB = 1024 * 1024
+
+
+def _mb(value):
+    return round((value or 0) / MB, 2)
+
+
+def cache_hit_ratio(cache):
+    """Share of page requests served from the WiredTiger cache, or None"""
+    requested = cache.get('pages requested from the cache')
+    read_in = cache.get('pages read into cache')
+    if not requested or read_in is None:
+        return None
+    return round(max(0.0, 1 - read_in / requested), 4)
+
+
+def collection_storage_stats(collection):
+    """Count, sizes, per-index sizes and cache usage for one collection"""
+    try:
+        storage = next(collection.aggregate([{'$collStats': {'storageStats': {}}}]), {}).get('storageStats', {})
+    except OperationFailure as e:
+        # Missing collections (code 26) simply have no stats yet
+        if e.code != 26:
+            raise
+        storage = {}
+    cache = storage.get('wiredTiger', {}).get('cache', {})
+    return {
+        "count": storage.get('count', 0),
+        "avg_size_bytes": storage.get('avgObjSize', 0),
+        "data_size_mb": _mb(storage.get('size')),
+        "storage_size_mb": _mb(storage.get('storageSize')),
+        "total_index_size_mb": _mb(storage.get('totalIndexSize')),
+        "index_sizes_mb": {name: _mb(size) for name, size in storage.get('indexSizes', {}).items()},
+        "cache_mb": _mb(cache.get('bytes currently in the cache')),
+        "cache_hit_ratio": cache_hit_ratio(cache)
+    }
+
+
+def server_cache_stats(server_status):
+    """WiredTiger cache usage and hit ratio from serverStatus"""
+    cache = server_status.get('wiredTiger', {}).get('cache', {})
+    if not cache:
+        return {}
+    return {
+        "used_mb": _mb(cache.get('bytes currently in the cache')),
+        "max_mb": _mb(cache.get('maximum bytes configured')),
+        "dirty_mb": _mb(cache.get('tracked dirty bytes in the cache')),
+        "hit_ratio": cache_hit_ratio(cache)
+    }
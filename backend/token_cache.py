@@ -0,0 +1,188 @@
+"""Bounded cache of verified JWT claims.
+
+``token_required`` would otherwise run a full HMAC verification and claim
+parse on every request. Verified claims are kept under a SHA-256 digest of
+the token (the raw token is never stored) until the earlier of the token's
+``exp`` and the cache TTL. The cache lives in each worker process.
+
+Revocations are shared: ``revoke`` records the digest in a ``revocations``
+collection (expired by a TTL index on ``expiresAt``). Instead of a lookup per
+request, each worker pulls the revocations recorded since its last sync in
+one query every ``revocation_sync_seconds``, so a logout takes effect in the
+worker that handled it at once and in every other worker within that window.
+"""
+import datetime
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Overlap between syncs so revocations stamped by a worker with a slightly
+# slower clock are not skipped
+SYNC_SKEW_SECONDS = 60
+
+
+class RevokedToken(Exception):
+    """Raised when a revoked token is presented"""
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+class TokenCache:
+    """Thread-safe LRU of verified claims with TTL capped at the token's exp"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=300, revocations=None, revocation_sync_seconds=5):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.revocations = revocations
+        self.revocation_sync_seconds = revocation_sync_seconds
+        self._entries = OrderedDict()
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self._synced_at = None
+        self._next_sync = 0.0
+        self._syncing = False
+        self.hits = 0
+        self.misses = 0
+        self.revocation_count = 0
+        self.revocation_syncs = 0
+
+    def verify(self, token, decode):
+        """Return the claims for token, calling decode(token) only on a cache miss.
+
+        Exceptions raised by decode (expired, invalid signature...) propagate and
+        nothing is cached for that token.
+        """
+        self._sync_revocations()
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            revoked_until = self._revoked.get(digest)
+            if revoked_until is not None:
+                if revoked_until > now:
+                    raise RevokedToken()
+                del self._revoked[digest]
+
+            entry = self._entries.get(digest)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return dict(claims)
+                del self._entries[digest]
+            self.misses += 1
+
+        claims = decode(token)
+        expires_at = now + self.ttl_seconds
+        if isinstance(claims.get('exp'), (int, float)):
+            expires_at = min(expires_at, claims['exp'])
+
+        with self._lock:
+            if digest not in self._revoked:
+                self._entries[digest] = (claims, expires_at)
+                self._entries.move_to_end(digest)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return dict(claims)
+
+    def _sync_revocations(self):
+        """Pull revocations recorded by any worker since the last sync, once per interval"""
+        if self.revocations is None:
+            return
+        now = time.time()
+        with self._lock:
+            if self._syncing or now < self._next_sync:
+                return
+            self._syncing = True
+            since = self._synced_at
+        started = datetime.datetime.utcnow()
+        try:
+            query = {}
+            if since is not None:
+                query = {'revokedAt': {'$gte': since - datetime.timedelta(seconds=SYNC_SKEW_SECONDS)}}
+            revoked = [
+                (doc['_id'], doc['expiresAt'].replace(tzinfo=datetime.timezone.utc).timestamp())
+                for doc in self.revocations.find(query, {'expiresAt': 1})
+            ]
+        except Exception as e:
+            logger.warning(f"Token revocation sync failed, retrying in {self.revocation_sync_seconds}s: {e}")
+            with self._lock:
+                self._syncing = False
+                self._next_sync = now + self.revocation_sync_seconds
+            return
+        with self._lock:
+            for digest, revoked_until in revoked:
+                if revoked_until > now:
+                    self._entries.pop(digest, None)
+                    self._revoked[digest] = revoked_until
+            self._purge_revoked()
+            self._synced_at = started
+            self._next_sync = now + self.revocation_sync_seconds
+            self._syncing = False
+            self.revocation_syncs += 1
+
+    def invalidate(self, token):
+        """Forget a cached token so the next request verifies it again"""
+        with self._lock:
+            return self._entries.pop(token_digest(token), None) is not None
+
+    def revoke(self, token, expires_at=None):
+        """Reject token in every worker until expires_at (epoch seconds; defaults to the cached exp or the TTL)"""
+        digest = token_digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if expires_at is None:
+                expires_at = entry[1] if entry else time.time() + self.ttl_seconds
+        if self.revocations is not None:
+            # Shared record first: if it fails the token is not reported as revoked
+            self.revocations.replace_one(
+                {'_id': digest},
+                {'_id': digest, 'expiresAt': datetime.datetime.utcfromtimestamp(expires_at),
+                 'revokedAt': datetime.datetime.utcnow()},
+                upsert=True
+            )
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._revoked[digest] = expires_at
+            self.revocation_count += 1
+            self._purge_revoked()
+
+    def revoke_user(self, user_id):
+        """Drop every cached token for a user (e.g. after deactivation)"""
+        with self._lock:
+            stale = [d for d, (claims, _) in self._entries.items() if claims.get('user_id') == user_id]
+            for digest in stale:
+                del self._entries[digest]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else None,
+                "revoked": len(self._revoked),
+                "revocations": self.revocation_count,
+                "revocationSyncs": self.revocation_syncs,
+                "revocationSyncSeconds": self.revocation_sync_seconds,
+                "lastRevocationSync": self._synced_at.isoformat() if self._synced_at else None
+            }
+
+    def _purge_revoked(self):
+        now = time.time()
+        for digest in [d for d, until in self._revoked.items() if until <= now]:
+            del self._revoked[digest]